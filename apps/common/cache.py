@@ -0,0 +1,136 @@
+import hashlib
+import time
+from functools import wraps
+from urllib.parse import urlencode
+
+from django.core.cache import cache
+from django.core.cache.backends.base import DEFAULT_TIMEOUT
+from rest_framework import status
+from rest_framework.response import Response
+
+from .conditional import cached_conditional_response
+
+GENERATION_KEY = "generation:{namespace}"
+STATS_KEY = "stats:{namespace}:{event}"
+# Response headers replayed on cache hits
+CACHED_HEADERS = ("ETag", "Last-Modified", "Vary")
+
+
+def _initial_generation():
+    # Milliseconds keep a re-created counter ahead of any evicted value
+    return int(time.time() * 1000)
+
+
+def get_generation(namespace):
+    """Current generation of a namespace of cached values"""
+    key = GENERATION_KEY.format(namespace=namespace)
+    generation = cache.get(key)
+    if generation is None:
+        cache.add(key, _initial_generation(), timeout=None)
+        generation = cache.get(key)
+    return generation
+
+
+def bump_generation(namespace):
+    """Invalidate every value cached under the namespace"""
+    key = GENERATION_KEY.format(namespace=namespace)
+    try:
+        return cache.incr(key)
+    except ValueError:
+        generation = _initial_generation()
+        cache.set(key, generation, timeout=None)
+        return generation
+
+
+def make_versioned_key(namespace, name, params=None):
+    """
+    Cache key for ``name`` in the current generation of ``namespace``.
+
+    ``params`` (a QueryDict) is normalized by sorting keys and values so
+    that equivalent query strings share an entry.
+    """
+    digest = ""
+    if params:
+        items = sorted((key, sorted(params.getlist(key))) for key in params)
+        query = urlencode(items, doseq=True)
+        digest = hashlib.md5(query.encode()).hexdigest()
+    generation = get_generation(namespace)
+    return f"{namespace}:{generation}:{name}:{digest}"
+
+
+def record_cache_event(namespace, event):
+    key = STATS_KEY.format(namespace=namespace, event=event)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.add(key, 1, timeout=None)
+
+
+def get_cache_stats(namespace):
+    """Hit and miss counters of a response cache namespace"""
+    hits = cache.get(STATS_KEY.format(namespace=namespace, event="hit"), 0)
+    misses = cache.get(STATS_KEY.format(namespace=namespace, event="miss"), 0)
+    lookups = hits + misses
+    return {
+        "hits": hits,
+        "misses": misses,
+        "hit_ratio": hits / lookups if lookups else 0.0,
+    }
+
+
+def reset_cache_stats(namespace):
+    cache.delete_many(
+        [
+            STATS_KEY.format(namespace=namespace, event=event)
+            for event in ("hit", "miss")
+        ]
+    )
+
+
+def cache_anonymous_response(namespace, timeout=DEFAULT_TIMEOUT):
+    """
+    Cache successful GET responses of a DRF view for anonymous users.
+
+    Entries are keyed on the path, the normalized query parameters and
+    the namespace generation, so bumping the generation after a write
+    makes every page cached before it unreachable.
+    """
+
+    def decorator(view_func):
+        @wraps(view_func)
+        def wrapper(request, *args, **kwargs):
+            if request.method != "GET" or request.user.is_authenticated:
+                return view_func(request, *args, **kwargs)
+
+            key = make_versioned_key(
+                namespace, request.path, request.query_params
+            )
+            cached = cache.get(key)
+            if cached is not None:
+                record_cache_event(namespace, "hit")
+                data, status_code, headers = cached
+                response = cached_conditional_response(request, headers)
+                if response is None:
+                    response = Response(data, status_code, headers=headers)
+                response["X-Cache"] = "HIT"
+                return response
+
+            record_cache_event(namespace, "miss")
+            response = view_func(request, *args, **kwargs)
+            if response.status_code == status.HTTP_200_OK:
+                headers = {
+                    header: response[header]
+                    for header in CACHED_HEADERS
+                    if header in response
+                }
+                cache.set(
+                    key,
+                    (response.data, response.status_code, headers),
+                    timeout,
+                )
+            response["X-Cache"] = "MISS"
+            return response
+
+        return wrapper
+
+    return decorator
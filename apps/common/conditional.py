@@ -0,0 +1,45 @@
+import hashlib
+
+from django.utils.cache import get_conditional_response, quote_etag
+from django.utils.http import http_date, parse_http_date_safe
+
+
+def make_etag(*parts):
+    """Strong ETag from the values that determine a representation"""
+    value = "|".join(str(part) for part in parts)
+    return quote_etag(hashlib.sha1(value.encode()).hexdigest())
+
+
+def set_validators(response, etag, last_modified):
+    response["ETag"] = etag
+    response["Last-Modified"] = http_date(last_modified.timestamp())
+    return response
+
+
+def conditional_response(request, etag, last_modified):
+    """
+    ``304 Not Modified`` (or ``412``) when the request's conditional
+    headers match the current validators, None when the full response
+    has to be sent.
+    """
+    response = get_conditional_response(
+        request, etag=etag, last_modified=int(last_modified.timestamp())
+    )
+    if response is not None:
+        set_validators(response, etag, last_modified)
+    return response
+
+
+def cached_conditional_response(request, headers):
+    """Same as ``conditional_response`` for validators stored as headers"""
+    if "ETag" not in headers:
+        return None
+    response = get_conditional_response(
+        request,
+        etag=headers["ETag"],
+        last_modified=parse_http_date_safe(headers.get("Last-Modified", "")),
+    )
+    if response is not None:
+        for header, value in headers.items():
+            response[header] = value
+    return response
@@ -0,0 +1,158 @@
+from functools import lru_cache
+from operator import itemgetter
+
+from django.core.exceptions import FieldDoesNotExist, ImproperlyConfigured
+from rest_framework import serializers
+from rest_framework.settings import api_settings
+
+
+class ValuesSerializer:
+    """
+    Render ``ModelSerializer`` output straight from ``values()`` rows.
+
+    The serializer class is inspected once per set of selected fields and
+    compiled into a list of ``values()`` columns and per-field getters, so
+    no serializer or model instance is created per row. Concrete model
+    fields, also behind forward foreign keys (``source="category.slug"``),
+    forward relations serialized by a nested ``ModelSerializer`` and file
+    fields are supported; anything else (properties, method fields) must
+    be given as a queryset expression in ``annotations``.
+
+    Field values are converted with the DRF fields themselves, so the
+    output is identical to ``serializer_class(objs, many=True).data``
+    rendered without a request in the context (file URLs stay relative).
+    """
+
+    def __init__(self, serializer_class, annotations=None):
+        self.serializer_class = serializer_class
+        self.annotations = annotations or {}
+        self._plans = lru_cache(maxsize=128)(self._compile)
+
+    def values(self, queryset, fields=None, extra=()):
+        """
+        ``queryset`` as ``values()`` rows holding every column needed to
+        render ``fields``, plus the ``extra`` ones (e.g. ordering fields
+        used by the paginator).
+        """
+        columns, annotations, _ = self._plan(fields)
+        if annotations:
+            queryset = queryset.annotate(**annotations)
+        return queryset.values(*columns, *extra)
+
+    def serialize(self, rows, fields=None):
+        """Representations of ``rows`` fetched with ``values()``"""
+        _, _, getters = self._plan(fields)
+        return [
+            {name: getter(row) for name, getter in getters} for row in rows
+        ]
+
+    def stream(self, rows, fields=None):
+        """Lazy ``serialize`` for rows from ``values().iterator()``"""
+        _, _, getters = self._plan(fields)
+        for row in rows:
+            yield {name: getter(row) for name, getter in getters}
+
+    def _plan(self, fields=None):
+        return self._plans(None if fields is None else tuple(fields))
+
+    def _compile(self, fields):
+        serializer = self.serializer_class()
+        columns, annotations = [], {}
+        getters = _compile_fields(
+            serializer, fields, "", columns, annotations, self.annotations
+        )
+        return tuple(columns), annotations, tuple(getters)
+
+
+def _compile_fields(serializer, fields, prefix, columns, annotations, known):
+    model = serializer.Meta.model
+    getters = []
+    for name, field in serializer.fields.items():
+        if field.write_only or (fields is not None and name not in fields):
+            continue
+
+        if not prefix and name in known:
+            annotations[name] = known[name]
+            columns.append(name)
+            getters.append((name, _getter(name, _converter(field))))
+            continue
+
+        try:
+            model_field = _model_field(model, field.source_attrs)
+        except FieldDoesNotExist:
+            raise ImproperlyConfigured(
+                f"{serializer.__class__.__name__}.{name} is not a model "
+                f"field, pass an annotation for it"
+            )
+        key = prefix + "__".join(field.source_attrs)
+
+        if isinstance(field, serializers.BaseSerializer):
+            if (
+                isinstance(field, serializers.ListSerializer)
+                or not model_field.many_to_one
+            ):
+                raise ImproperlyConfigured(
+                    f"{serializer.__class__.__name__}.{name}: only forward "
+                    f"foreign keys can be rendered from values() rows"
+                )
+            nested = _compile_fields(
+                field, None, f"{key}__", columns, annotations, {}
+            )
+            columns.append(key)
+            getters.append((name, _nested_getter(key, nested)))
+            continue
+
+        columns.append(key)
+        getters.append((name, _getter(key, _converter(field, model_field))))
+    return getters
+
+
+def _model_field(model, source_attrs):
+    if not source_attrs:
+        raise FieldDoesNotExist("*")
+    *relations, name = source_attrs
+    for relation in relations:
+        related = model._meta.get_field(relation)
+        if not related.many_to_one:
+            raise FieldDoesNotExist(relation)
+        model = related.related_model
+    return model._meta.get_field(name)
+
+
+def _converter(field, model_field=None):
+    if isinstance(field, serializers.ReadOnlyField):
+        return None
+    if isinstance(field, serializers.FileField):
+        # values() returns the stored name instead of a FieldFile
+        storage = model_field.storage
+        use_url = getattr(
+            field, "use_url", api_settings.UPLOADED_FILES_USE_URL
+        )
+
+        def file_url(name):
+            if not name:
+                return None
+            return storage.url(name) if use_url else name
+
+        return file_url
+    return field.to_representation
+
+
+def _getter(key, convert):
+    if convert is None:
+        return itemgetter(key)
+
+    def getter(row):
+        value = row[key]
+        return None if value is None else convert(value)
+
+    return getter
+
+
+def _nested_getter(key, getters):
+    def getter(row):
+        if row[key] is None:
+            return None
+        return {name: get(row) for name, get in getters}
+
+    return getter
@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand
+
+from apps.common.cache import get_cache_stats, reset_cache_stats
+
+
+class Command(BaseCommand):
+    help = "Show hit and miss statistics of the response caches"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "namespaces",
+            nargs="*",
+            default=["catalog"],
+            help="Cache namespaces to report (default: catalog)",
+        )
+        parser.add_argument(
+            "--reset",
+            action="store_true",
+            help="Reset the counters after reporting them",
+        )
+
+    def handle(self, *args, **options):
+        for namespace in options["namespaces"]:
+            stats = get_cache_stats(namespace)
+            self.stdout.write(
+                f"{namespace}: {stats['hits']} hits, "
+                f"{stats['misses']} misses, "
+                f"hit ratio {stats['hit_ratio']:.1%}"
+            )
+            if options["reset"]:
+                reset_cache_stats(namespace)
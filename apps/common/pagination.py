@@ -1,5 +1,16 @@
-from rest_framework.pagination import PageNumberPagination
+import base64
+import datetime
+import decimal
+import json
+from functools import reduce
+
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.db.models import Q
+from django.utils.translation import gettext_lazy as _
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination
 from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
 
 
 class CustomPageNumberPagination(PageNumberPagination):
@@ -27,3 +38,188 @@ class CustomPageNumberPagination(PageNumberPagination):
                 },
             }
         )
+
+
+class CustomCursorPagination(BasePagination):
+    """
+    Keyset pagination over an explicit ordering.
+
+    The last ordering field must be unique (normally "id") so that every
+    row has a distinct position. Pages are fetched with a WHERE clause on
+    the ordering columns instead of OFFSET and no COUNT(*) is issued.
+    """
+
+    page_size = 20
+    page_size_query_param = "limit"
+    max_page_size = 100
+    cursor_query_param = "cursor"
+    invalid_cursor_message = _("Invalid cursor")
+
+    def __init__(self, ordering):
+        self.ordering = tuple(ordering)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.base_url = request.build_absolute_uri()
+        self.page_size = self.get_page_size(request)
+        position, reverse = self.decode_cursor(request, queryset.model)
+
+        ordering = self.ordering
+        if reverse:
+            ordering = tuple(_invert(field) for field in ordering)
+        queryset = queryset.order_by(*ordering)
+        if position is not None:
+            queryset = queryset.filter(_keyset_filter(ordering, position))
+
+        results = list(queryset[: self.page_size + 1])
+        has_more = len(results) > self.page_size
+        results = results[: self.page_size]
+
+        if reverse:
+            results.reverse()
+            self.has_next, self.has_previous = True, has_more
+        else:
+            self.has_next, self.has_previous = has_more, position is not None
+
+        self.page = results
+        return results
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        if page_size <= 0:
+            return self.page_size
+        return min(page_size, self.max_page_size)
+
+    def decode_cursor(self, request, model):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None, False
+        try:
+            payload = json.loads(base64.urlsafe_b64decode(encoded.encode()))
+            values, reverse = payload["p"], bool(payload["r"])
+            if len(values) != len(self.ordering):
+                raise ValueError
+            position = [
+                _to_python(model, field, value)
+                for field, value in zip(self.ordering, values)
+            ]
+        except (TypeError, ValueError, KeyError, ValidationError):
+            raise NotFound(self.invalid_cursor_message)
+        return position, reverse
+
+    def encode_cursor(self, obj, reverse):
+        values = [
+            _to_json(_position_value(obj, _field_name(field)))
+            for field in self.ordering
+        ]
+        payload = json.dumps(
+            {"p": values, "r": int(reverse)}, separators=(",", ":")
+        )
+        return base64.urlsafe_b64encode(payload.encode()).decode()
+
+    def get_next_cursor(self):
+        if not self.has_next or not self.page:
+            return None
+        return self.encode_cursor(self.page[-1], reverse=False)
+
+    def get_previous_cursor(self):
+        if not self.has_previous or not self.page:
+            return None
+        return self.encode_cursor(self.page[0], reverse=True)
+
+    def get_link(self, cursor):
+        if cursor is None:
+            return None
+        return replace_query_param(
+            remove_query_param(self.base_url, "page"),
+            self.cursor_query_param,
+            cursor,
+        )
+
+    def get_paginated_response(self, data):
+        next_cursor = self.get_next_cursor()
+        prev_cursor = self.get_previous_cursor()
+        return Response(
+            {
+                "success": True,
+                "data": data,
+                "meta": {
+                    "pagination": {
+                        "count": len(data),
+                        "per_page": self.page_size,
+                        "cursors": {
+                            "next": next_cursor,
+                            "prev": prev_cursor,
+                        },
+                        "links": {
+                            "next": self.get_link(next_cursor),
+                            "prev": self.get_link(prev_cursor),
+                        },
+                    }
+                },
+            }
+        )
+
+
+def get_paginator(request, ordering):
+    """
+    Pick the pagination mode for a list endpoint.
+
+    Clients opt in to keyset pagination by sending a ``cursor`` parameter
+    (empty for the first page), otherwise page numbers are used.
+    """
+    if CustomCursorPagination.cursor_query_param in request.query_params:
+        return CustomCursorPagination(ordering)
+    return CustomPageNumberPagination()
+
+
+def _field_name(field):
+    return field.lstrip("-")
+
+
+def _position_value(obj, name):
+    # Pages hold model instances or values() rows
+    if isinstance(obj, dict):
+        return obj[name]
+    return getattr(obj, name)
+
+
+def _invert(field):
+    return field[1:] if field.startswith("-") else f"-{field}"
+
+
+def _to_json(value):
+    # Keep full precision, microseconds included, so positions are exact
+    if isinstance(value, (datetime.date, datetime.time)):
+        return value.isoformat()
+    if isinstance(value, decimal.Decimal):
+        return str(value)
+    return value
+
+
+def _to_python(model, field, value):
+    try:
+        return model._meta.get_field(_field_name(field)).to_python(value)
+    except FieldDoesNotExist:
+        return value
+
+
+def _keyset_filter(ordering, position):
+    """Rows strictly after ``position`` in ``ordering``"""
+    conditions = []
+    for index, field in enumerate(ordering):
+        name = _field_name(field)
+        lookup = "lt" if field.startswith("-") else "gt"
+        equal = {
+            _field_name(prev): value
+            for prev, value in zip(ordering[:index], position)
+        }
+        conditions.append(Q(**equal, **{f"{name}__{lookup}": position[index]}))
+    # Redundant bound on the leading column lets the index seek directly
+    first = ordering[0]
+    bound = "lte" if first.startswith("-") else "gte"
+    return Q(**{f"{_field_name(first)}__{bound}": position[0]}) & reduce(
+        lambda left, right: left | right, conditions
+    )
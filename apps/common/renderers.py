@@ -0,0 +1,112 @@
+import csv
+
+import orjson
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+
+# DRF only sets separators, so every other value is left to the default
+# hook, which reuses the stock encoder (Decimal, Promise, timedelta, ...)
+ORJSON_OPTIONS = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS
+
+
+class ORJSONRenderer(JSONRenderer):
+    """
+    ``JSONRenderer`` backed by orjson.
+
+    Output matches the stock renderer with the default compact, unicode
+    settings, except for floats: very large or small ones are written
+    without the exponent sign and padding (``1e16``, not ``1e+16``), and
+    NaN and infinities as ``null`` where the strict stock renderer raises
+    ``ValueError``. Indented output, non-default settings and payloads
+    orjson rejects (e.g. integers beyond 64 bits) go through
+    ``JSONRenderer``.
+    """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b""
+
+        indent = self.get_indent(accepted_media_type, renderer_context or {})
+        if indent is not None or self.ensure_ascii or not self.compact:
+            return super().render(data, accepted_media_type, renderer_context)
+
+        try:
+            ret = orjson.dumps(
+                data,
+                default=self.encoder_class().default,
+                option=ORJSON_OPTIONS,
+            )
+        except orjson.JSONEncodeError:
+            return super().render(data, accepted_media_type, renderer_context)
+
+        # Same JavaScript-safe escaping as JSONRenderer
+        return ret.replace(b"\xe2\x80\xa8", b"\\u2028").replace(
+            b"\xe2\x80\xa9", b"\\u2029"
+        )
+
+
+class NDJSONRenderer(BaseRenderer):
+    """
+    Newline delimited JSON, one record per line.
+
+    ``stream`` encodes an iterable of records lazily for
+    ``StreamingHttpResponse``; ``render`` handles regular responses such
+    as errors.
+    """
+
+    media_type = "application/x-ndjson"
+    format = "ndjson"
+    charset = None
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b""
+        return b"".join(
+            self.stream(data if isinstance(data, list) else [data])
+        )
+
+    def stream(self, records):
+        renderer = ORJSONRenderer()
+        for record in records:
+            yield renderer.render(record) + b"\n"
+
+
+class CSVRenderer(BaseRenderer):
+    """
+    CSV with a header row taken from the keys of the first record.
+
+    Nested objects, lists and booleans are written as JSON.
+    """
+
+    media_type = "text/csv"
+    format = "csv"
+    charset = "utf-8"
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b""
+        return b"".join(
+            self.stream(data if isinstance(data, list) else [data])
+        )
+
+    def stream(self, records):
+        writer = csv.writer(_Echo())
+        header = None
+        for record in records:
+            if header is None:
+                header = list(record)
+                yield writer.writerow(header).encode()
+            yield writer.writerow(
+                [_csv_value(record.get(column)) for column in header]
+            ).encode()
+
+
+class _Echo:
+    # csv.writer target returning each row instead of buffering it
+    def write(self, value):
+        return value
+
+
+def _csv_value(value):
+    if isinstance(value, (dict, list, bool)):
+        return ORJSONRenderer().render(value).decode()
+    return value
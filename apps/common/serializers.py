@@ -0,0 +1,32 @@
+class DynamicFieldsMixin:
+    """
+    ModelSerializer mixin for sparse fieldsets.
+
+    ``fields`` / ``exclude`` query parameters hold comma separated
+    top-level field names. Views resolve them with ``selected_fields``
+    (to skip joins, annotations and prefetches of omitted fields) and
+    pass the result to the serializer as the ``fields`` argument.
+    """
+
+    def __init__(self, *args, fields=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        if fields is not None:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+
+    @classmethod
+    def selected_fields(cls, request):
+        """Serializer field names requested by ``request``, in order"""
+        requested = _split(request.query_params.get("fields"))
+        excluded = _split(request.query_params.get("exclude"))
+        return [
+            name
+            for name in cls.Meta.fields
+            if (not requested or name in requested) and name not in excluded
+        ]
+
+
+def _split(value):
+    if not value:
+        return set()
+    return {name.strip() for name in value.split(",") if name.strip()}
@@ -0,0 +1,49 @@
+import hashlib
+import posixpath
+
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+
+
+class ContentAddressedStorageMixin:
+    """
+    Name files after the SHA-256 of their content.
+
+    The directory chosen by ``upload_to`` and the extension are kept,
+    ``products/images/photo.JPG`` is stored as
+    ``products/images/ab12...ef.jpg``. Saving content that is already
+    stored writes nothing and returns the existing name, so identical
+    uploads share one file. Files may therefore be referenced by several
+    rows and must not be deleted along with one of them.
+    """
+
+    content_addressed = True
+
+    def hashed_name(self, name, content):
+        digest = hashlib.sha256()
+        content.seek(0)
+        for chunk in content.chunks():
+            digest.update(chunk)
+        content.seek(0)
+        hexdigest = digest.hexdigest()
+        directory, filename = posixpath.split(name)
+        extension = posixpath.splitext(filename)[1].lower()
+        return posixpath.join(directory, f"{hexdigest}{extension}")
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        if not hasattr(content, "chunks"):
+            content = File(content, name)
+        name = self.hashed_name(name, content)
+        if self.exists(name):
+            # Same name, same bytes
+            return name
+        return super().save(name, content, max_length=max_length)
+
+
+class ContentAddressedStorage(ContentAddressedStorageMixin, FileSystemStorage):
+    def __init__(self, **kwargs):
+        # Concurrent uploads of the same file write identical bytes
+        kwargs["allow_overwrite"] = True
+        super().__init__(**kwargs)
@@ -1 +1,373 @@
-# Create your tests here.
+import base64
+import datetime
+import decimal
+import io
+import json
+import shutil
+import tempfile
+import uuid
+
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.translation import gettext_lazy
+from rest_framework.exceptions import ParseError
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+
+from apps.orders.models import Order, OrderItem
+from apps.orders.serializers import OrderListSerializer, order_list_values
+from apps.products.models import (
+    CATALOG_CACHE,
+    Category,
+    Product,
+    ProductLike,
+)
+from apps.products.serializers import (
+    ProductListSerializer,
+    product_list_values,
+)
+from apps.users.models import User
+
+from .cache import get_cache_stats
+from .pagination import _keyset_filter
+from .parsers import ORJSONParser
+from .renderers import ORJSONRenderer
+from .storage import ContentAddressedStorage
+
+
+class ValuesSerializerTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name="Phones", slug="phones")
+        cls.products = [
+            Product.objects.create(
+                title=f"Phone {index}",
+                description="A phone",
+                price=f"{index}99.5",
+                category=category,
+                thumbnail=(
+                    f"products/thumbnails/phone-{index}.jpg"
+                    if index % 2
+                    else ""
+                ),
+            )
+            for index in range(4)
+        ]
+        Product.objects.filter(id=cls.products[0].id).update(
+            average_rating=4.25, likes_count=3
+        )
+        user = User.objects.create(phone="+998900000001")
+        # Order.save sends notifications, bulk_create skips it
+        Order.objects.bulk_create(
+            [
+                Order(
+                    user=user,
+                    order_number=f"ORD-{index}",
+                    shipping_address="Tashkent",
+                    subtotal="10.00",
+                    total="15.00",
+                )
+                for index in range(3)
+            ]
+        )
+        order = Order.objects.first()
+        OrderItem.objects.bulk_create(
+            [
+                OrderItem(order=order, product=product, quantity=2, price=1)
+                for product in cls.products[:2]
+            ]
+        )
+
+    def assertSameJSON(self, expected, actual):
+        renderer = JSONRenderer()
+        self.assertEqual(renderer.render(expected), renderer.render(actual))
+
+    def test_product_list_matches_serializer(self):
+        queryset = Product.objects.order_by("id")
+        expected = ProductListSerializer(
+            queryset.select_related("category"), many=True
+        ).data
+        rows = product_list_values.values(queryset)
+
+        self.assertSameJSON(expected, product_list_values.serialize(rows))
+
+    def test_product_list_sparse_fields(self):
+        fields = ["id", "category", "likes_count"]
+        queryset = Product.objects.order_by("id")
+        expected = ProductListSerializer(
+            queryset, many=True, fields=fields
+        ).data
+        rows = product_list_values.values(queryset, fields)
+
+        self.assertSameJSON(
+            expected, product_list_values.serialize(rows, fields)
+        )
+
+    def test_order_list_matches_serializer(self):
+        queryset = Order.objects.order_by("-created_at", "-id")
+        expected = OrderListSerializer(queryset, many=True).data
+        rows = order_list_values.values(queryset)
+
+        self.assertSameJSON(expected, order_list_values.serialize(rows))
+
+
+class ORJSONTests(TestCase):
+    def test_render_matches_json_renderer(self):
+        data = {
+            "price": decimal.Decimal("19.99"),
+            "created_at": timezone.now(),
+            "naive": datetime.datetime(2026, 1, 2, 3, 4, 5, 678901),
+            "date": datetime.date(2026, 1, 2),
+            "time": datetime.time(10, 30, 0, 5),
+            "duration": datetime.timedelta(minutes=90),
+            "uuid": uuid.uuid4(),
+            "message": gettext_lazy("Not found."),
+            "thumbnail": "/media/products/thumbnails/phone.jpg",
+            "unicode": "Toshkent \u2028 \u2029 \u00e9",
+            "floats": [0.0, 4.25, 1 / 3],
+            "nested": [{1: None, "ok": True}],
+            "big": 2**70,
+        }
+
+        self.assertEqual(
+            ORJSONRenderer().render(data), JSONRenderer().render(data)
+        )
+
+    def test_render_float_differences(self):
+        data = {"large": 1e16, "small": 1.5e-7, "nan": float("nan")}
+
+        self.assertEqual(
+            ORJSONRenderer().render(data),
+            b'{"large":1e16,"small":1.5e-7,"nan":null}',
+        )
+        with self.assertRaises(ValueError):
+            JSONRenderer().render(data)
+
+    def test_render_indent_falls_back(self):
+        data = {"items": [1, 2]}
+        media_type = "application/json; indent=4"
+
+        self.assertEqual(
+            ORJSONRenderer().render(data, media_type),
+            JSONRenderer().render(data, media_type),
+        )
+
+    def test_parse(self):
+        stream = io.BytesIO('{"title": "Telefon \u00e9", "qty": 2}'.encode())
+
+        self.assertEqual(
+            ORJSONParser().parse(stream),
+            {"title": "Telefon \u00e9", "qty": 2},
+        )
+
+    def test_parse_error(self):
+        for body in [b"{", b'{"price": NaN}']:
+            with self.assertRaises(ParseError):
+                ORJSONParser().parse(io.BytesIO(body))
+
+
+class ContentAddressedStorageTests(TestCase):
+    def setUp(self):
+        location = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, location)
+        self.storage = ContentAddressedStorage(location=location)
+
+    def test_identical_content_shares_a_file(self):
+        first = self.storage.save("images/a.JPG", ContentFile(b"photo"))
+        second = self.storage.save("images/b.jpg", ContentFile(b"photo"))
+        other = self.storage.save("images/a.jpg", ContentFile(b"other"))
+
+        self.assertEqual(first, second)
+        self.assertNotEqual(first, other)
+        self.assertRegex(first, r"^images/[0-9a-f]{64}\.jpg$")
+        self.assertEqual(len(self.storage.listdir("images")[1]), 2)
+        with self.storage.open(first) as file:
+            self.assertEqual(file.read(), b"photo")
+
+
+LOCMEM_CACHES = {
+    "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}
+}
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class CursorPaginationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name="Phones", slug="phones")
+        # Repeated prices make "id" decide the order within a price
+        cls.products = Product.objects.bulk_create(
+            [
+                Product(
+                    title=f"Phone {index}",
+                    description="A phone",
+                    price=price,
+                    category=category,
+                )
+                for index, price in enumerate([3, 1, 2, 2, 5, 1, 4])
+            ]
+        )
+
+    def setUp(self):
+        self.url = reverse("product_list")
+
+    def encode(self, payload):
+        return base64.urlsafe_b64encode(json.dumps(payload).encode()).decode()
+
+    def test_keyset_filter(self):
+        queryset = Product.objects.all()
+        for ordering in [("price", "id"), ("-price", "-id")]:
+            rows = list(queryset.order_by(*ordering).values("price", "id"))
+            for index, row in enumerate(rows):
+                with self.subTest(ordering=ordering, position=row):
+                    after = queryset.filter(
+                        _keyset_filter(ordering, [row["price"], row["id"]])
+                    ).order_by(*ordering)
+                    self.assertEqual(
+                        list(after.values("price", "id")), rows[index + 1 :]
+                    )
+
+    def page(self, params):
+        response = self.client.get(self.url, params)
+        self.assertEqual(response.status_code, 200)
+        cursors = response.data["meta"]["pagination"]["cursors"]
+        titles = [product["title"] for product in response.data["data"]]
+        return titles, cursors["next"], cursors["prev"]
+
+    def test_next_and_prev_round_trip(self):
+        for order in ("asc", "desc"):
+            with self.subTest(order=order):
+                params = {"sort": "price", "order": order, "limit": 3}
+                pages, prev = [], None
+                cursor = ""
+                while cursor is not None:
+                    titles, cursor, prev = self.page(
+                        {**params, "cursor": cursor}
+                    )
+                    pages.append(titles)
+                expected = list(
+                    Product.objects.order_by(
+                        *(
+                            ("price", "id")
+                            if order == "asc"
+                            else ("-price", "-id")
+                        )
+                    ).values_list("title", flat=True)
+                )
+                self.assertEqual(sum(pages, []), expected)
+                self.assertEqual([len(titles) for titles in pages], [3, 3, 1])
+
+                # Walking back from the last page with the prev cursors
+                # gives the same pages, each in forward order
+                backwards = []
+                while prev is not None:
+                    titles, _, prev = self.page({**params, "cursor": prev})
+                    backwards.append(titles)
+                self.assertEqual(backwards, pages[-2::-1])
+
+    def test_invalid_cursors_are_rejected(self):
+        cursors = [
+            "garbage",
+            self.encode([1, 2]),
+            self.encode({"p": [1], "r": 0}),
+            self.encode({"p": ["not a price", 1], "r": 0}),
+            self.encode({"p": [1, 2]}),
+        ]
+        for cursor in cursors:
+            with self.subTest(cursor=cursor):
+                response = self.client.get(
+                    self.url, {"sort": "price", "cursor": cursor}
+                )
+                self.assertEqual(response.status_code, 404)
+
+        # A cursor only fits the ordering it was issued for
+        _, cursor, _ = self.page({"sort": "price", "limit": 2, "cursor": ""})
+        response = self.client.get(
+            self.url, {"sort": "created_at", "cursor": cursor}
+        )
+        self.assertEqual(response.status_code, 404)
+
+    def test_sort_must_be_whitelisted(self):
+        response = self.client.get(self.url, {"sort": "title", "cursor": ""})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("sort", response.data["error"]["details"])
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class ResponseCacheTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name="Phones", slug="phones")
+        cls.product = Product.objects.create(
+            title="Phone",
+            description="A phone",
+            price="1.00",
+            category=category,
+        )
+        cls.user = User.objects.create(phone="+998900000001")
+
+    def setUp(self):
+        cache.clear()
+        self.url = reverse("product_list")
+
+    def test_hit_after_miss(self):
+        response = self.client.get(self.url, {"sort": "price", "limit": 5})
+        self.assertEqual(response["X-Cache"], "MISS")
+        # Equivalent query strings share the entry
+        with self.assertNumQueries(0):
+            response = self.client.get(self.url, {"limit": 5, "sort": "price"})
+        self.assertEqual(response["X-Cache"], "HIT")
+        self.assertEqual(response.data["data"][0]["title"], "Phone")
+
+        detail = reverse("product_detail", args=[self.product.id])
+        etag = self.client.get(detail)["ETag"]
+        response = self.client.get(detail, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response["X-Cache"], "HIT")
+
+    def test_authenticated_requests_bypass_the_cache(self):
+        self.client.get(self.url)
+        client = APIClient()
+        client.force_authenticate(self.user)
+        response = client.get(self.url)
+        self.assertNotIn("X-Cache", response)
+        self.assertEqual(get_cache_stats(CATALOG_CACHE)["hits"], 0)
+
+    def test_writes_invalidate_cached_pages(self):
+        self.client.get(self.url)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.product.title = "Smartphone"
+            self.product.save()
+        response = self.client.get(self.url)
+        self.assertEqual(response["X-Cache"], "MISS")
+        self.assertEqual(response.data["data"][0]["title"], "Smartphone")
+
+    def test_likes_invalidate_cached_pages(self):
+        detail = reverse("product_detail", args=[self.product.id])
+        self.client.get(self.url)
+        self.client.get(detail)
+        with self.captureOnCommitCallbacks(execute=True):
+            ProductLike.objects.create(user=self.user, product=self.product)
+        for url in (self.url, detail):
+            response = self.client.get(url)
+            self.assertEqual(response["X-Cache"], "MISS")
+        self.assertEqual(response.data["data"]["likes_count"], 1)
+
+    def test_cache_stats_command(self):
+        for _ in range(3):
+            self.client.get(self.url)
+        self.assertEqual(
+            get_cache_stats(CATALOG_CACHE),
+            {"hits": 2, "misses": 1, "hit_ratio": 2 / 3},
+        )
+
+        out = io.StringIO()
+        call_command("cache_stats", "--reset", stdout=out)
+        self.assertEqual(
+            out.getvalue(), "catalog: 2 hits, 1 misses, hit ratio 66.7%\n"
+        )
+        self.assertEqual(get_cache_stats(CATALOG_CACHE)["misses"], 0)
@@ -0,0 +1,22 @@
+# Generated by Django 5.2 on 2026-10-18 10:55
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("orders", "0002_initial"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="order",
+            index=models.Index(
+                fields=["user", "-created_at", "-id"],
+                name="order_user_created_idx",
+            ),
+        ),
+    ]
@@ -36,6 +36,12 @@ class Order(BaseModel):
 
     class Meta:
         ordering = ["-created_at"]
+        indexes = [
+            models.Index(
+                fields=["user", "-created_at", "-id"],
+                name="order_user_created_idx",
+            ),
+        ]
 
     def __str__(self):
         return self.order_number
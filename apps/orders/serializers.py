@@ -1,5 +1,9 @@
+from django.db.models import Sum
+from django.db.models.functions import Coalesce
 from rest_framework import serializers
 
+from apps.common.fast_serializers import ValuesSerializer
+from apps.common.serializers import DynamicFieldsMixin
 from apps.products.models import Product
 
 from .models import Order, OrderItem
@@ -35,7 +39,14 @@ class OrderListSerializer(serializers.ModelSerializer):
         ]
 
 
-class OrderDetailSerializer(serializers.ModelSerializer):
+# Renders the order list from values() rows
+order_list_values = ValuesSerializer(
+    OrderListSerializer,
+    annotations={"items_count": Coalesce(Sum("items__quantity"), 0)},
+)
+
+
+class OrderDetailSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     items = OrderItemSerializer(many=True, read_only=True)
     items_count = serializers.ReadOnlyField()
 
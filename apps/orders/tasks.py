@@ -0,0 +1,65 @@
+from celery import shared_task
+from django.conf import settings
+from django.db import connection, transaction
+
+from apps.common.cache import bump_generation
+from apps.products.models import CATALOG_CACHE, ProductRelation
+
+from .models import Order, OrderItem
+
+
+def rebuild_product_relations(limit=None):
+    """
+    Replace every ``ProductRelation`` with the current co-purchase counts.
+
+    Pairs are counted in the database by joining order items with the
+    other items of their order, then ranked per product with a window
+    function; only the ``limit`` best of each product are stored. Returns
+    the number of relations written.
+    """
+    limit = limit or settings.PRODUCT_RELATED_LIMIT
+    quote = connection.ops.quote_name
+    sql = f"""
+        INSERT INTO {quote(ProductRelation._meta.db_table)}
+            (product_id, related_id, {quote("rank")}, score)
+        SELECT product_id, related_id, related_rank, score
+        FROM (
+            SELECT
+                product_id,
+                related_id,
+                score,
+                ROW_NUMBER() OVER (
+                    PARTITION BY product_id
+                    ORDER BY score DESC, related_id
+                ) AS related_rank
+            FROM (
+                SELECT
+                    item.product_id,
+                    other.product_id AS related_id,
+                    COUNT(DISTINCT item.order_id) AS score
+                FROM {quote(OrderItem._meta.db_table)} item
+                JOIN {quote(OrderItem._meta.db_table)} other
+                    ON other.order_id = item.order_id
+                    AND other.product_id <> item.product_id
+                JOIN {quote(Order._meta.db_table)} orders
+                    ON orders.id = item.order_id
+                WHERE orders.status <> %s
+                GROUP BY item.product_id, other.product_id
+            ) pairs
+        ) ranked
+        WHERE related_rank <= %s
+    """
+    with transaction.atomic():
+        # Readers keep the previous lists until the new ones are committed
+        ProductRelation.objects.all().delete()
+        with connection.cursor() as cursor:
+            cursor.execute(sql, ["cancelled", limit])
+            created = cursor.rowcount
+        transaction.on_commit(lambda: bump_generation(CATALOG_CACHE))
+    return created
+
+
+@shared_task
+def compute_product_relations():
+    """Periodic rebuild of the "frequently bought together" lists"""
+    return rebuild_product_relations()
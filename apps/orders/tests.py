@@ -1,3 +1,112 @@
-from django.test import TestCase
+from unittest import mock
 
-# Create your tests here.
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from apps.products.models import Category, Product
+from apps.users.models import User
+
+from .models import Order, OrderItem
+
+LOCMEM_CACHES = {
+    "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}
+}
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class OrderDetailConditionalTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name="Phones", slug="phones")
+        cls.phone, cls.case = [
+            Product.objects.create(
+                title=title, description=title, price=price, category=category
+            )
+            for title, price in [("Phone", "499.00"), ("Case", "9.00")]
+        ]
+        cls.user = User.objects.create(phone="+998900000001")
+        # Order.save queues an SMS notification for new orders
+        with mock.patch(
+            "apps.common.utils.send_order_notification_async", create=True
+        ):
+            cls.order = Order.objects.create(
+                user=cls.user,
+                shipping_address="Tashkent",
+                subtotal="499.00",
+                total="504.00",
+            )
+        cls.item = OrderItem.objects.create(
+            order=cls.order, product=cls.phone, quantity=1
+        )
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.url = reverse("order_detail", args=[self.order.id])
+
+    def get(self, etag=None, **params):
+        headers = {"HTTP_IF_NONE_MATCH": etag} if etag else {}
+        return self.client.get(self.url, params, **headers)
+
+    def assertEtagChanged(self, etag):
+        response = self.get(etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+        return response
+
+    def test_not_modified_round_trip(self):
+        response = self.get()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["data"]["items"][0]["quantity"], 1)
+        self.assertIn("Last-Modified", response)
+
+        # Only the validator query, the order is not loaded
+        with self.assertNumQueries(1):
+            response = self.get(response["ETag"])
+        self.assertEqual(response.status_code, 304)
+        self.assertFalse(response.content)
+
+    def test_fields_have_their_own_etag(self):
+        etag = self.get()["ETag"]
+        response = self.get(etag, fields="id,status")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(set(response.data["data"]), {"id", "status"})
+        self.assertNotEqual(response["ETag"], etag)
+
+    def test_order_changes_change_the_etag(self):
+        etag = self.get()["ETag"]
+        self.order.status = "shipped"
+        self.order.save()
+        response = self.assertEtagChanged(etag)
+        self.assertEqual(response.data["data"]["status"], "shipped")
+
+    def test_item_changes_change_the_etag(self):
+        etag = self.get()["ETag"]
+        self.item.quantity = 2
+        self.item.save()
+        etag = self.assertEtagChanged(etag)["ETag"]
+
+        item = OrderItem.objects.create(
+            order=self.order, product=self.case, quantity=1
+        )
+        etag = self.assertEtagChanged(etag)["ETag"]
+
+        item.delete()
+        response = self.assertEtagChanged(etag)
+        self.assertEqual(len(response.data["data"]["items"]), 1)
+
+    def test_product_changes_change_the_etag(self):
+        etag = self.get()["ETag"]
+        self.phone.title = "Smartphone"
+        self.phone.save()
+        response = self.assertEtagChanged(etag)
+        self.assertEqual(
+            response.data["data"]["items"][0]["product"]["title"],
+            "Smartphone",
+        )
+
+    def test_other_users_orders_are_not_found(self):
+        client = APIClient()
+        client.force_authenticate(User.objects.create(phone="+998900000002"))
+        self.assertEqual(client.get(self.url).status_code, 404)
@@ -1,10 +1,17 @@
 from django.db import transaction
+from django.db.models import Count, Max, Prefetch
+from django.http import Http404
 from django.shortcuts import get_object_or_404
 from rest_framework import status
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import IsAuthenticated
 
-from apps.common.pagination import CustomPageNumberPagination
+from apps.common.conditional import (
+    conditional_response,
+    make_etag,
+    set_validators,
+)
+from apps.common.pagination import get_paginator
 from apps.common.responses import APIResponse
 from apps.products.models import Cart
 
@@ -12,7 +19,7 @@ from .models import Order, OrderItem
 from .serializers import (
     CreateOrderSerializer,
     OrderDetailSerializer,
-    OrderListSerializer,
+    order_list_values,
 )
 
 
@@ -29,15 +36,18 @@ def orders_view(request):
             queryset = queryset.filter(status=status_filter)
 
         # Paginate
-        paginator = CustomPageNumberPagination()
+        ordering = ("-created_at", "-id")
+        queryset = order_list_values.values(
+            queryset.order_by(*ordering), extra=["created_at", "id"]
+        )
+        paginator = get_paginator(request, ordering)
         page = paginator.paginate_queryset(queryset, request)
 
         if page is not None:
-            serializer = OrderListSerializer(page, many=True)
-            return paginator.get_paginated_response(serializer.data)
+            data = order_list_values.serialize(page)
+            return paginator.get_paginated_response(data)
 
-        serializer = OrderListSerializer(queryset, many=True)
-        return APIResponse.success(serializer.data)
+        return APIResponse.success(order_list_values.serialize(queryset))
 
     elif request.method == "POST":
         serializer = CreateOrderSerializer(data=request.data)
@@ -86,6 +96,49 @@ def orders_view(request):
 @permission_classes([IsAuthenticated])
 def order_detail(request, id):
     """Get order details"""
-    order = get_object_or_404(Order, id=id, user=request.user)
-    serializer = OrderDetailSerializer(order)
-    return APIResponse.success(serializer.data)
+    fields = OrderDetailSerializer.selected_fields(request)
+    validators = (
+        Order.objects.filter(id=id, user=request.user)
+        .annotate(
+            items_count=Count("items"),
+            items_updated_at=Max("items__updated_at"),
+            products_updated_at=Max("items__product__updated_at"),
+        )
+        .values_list(
+            "updated_at",
+            "items_count",
+            "items_updated_at",
+            "products_updated_at",
+        )
+        .first()
+    )
+    if validators is None:
+        raise Http404
+    updated_at, items_count, items_updated_at, products_updated_at = validators
+    etag = make_etag(
+        id,
+        ",".join(fields),
+        updated_at,
+        items_count,
+        items_updated_at,
+        products_updated_at,
+    )
+    last_modified = max(
+        filter(None, [updated_at, items_updated_at, products_updated_at])
+    )
+    not_modified = conditional_response(request, etag, last_modified)
+    if not_modified is not None:
+        return not_modified
+
+    queryset = Order.objects.filter(user=request.user)
+    if "items" in fields:
+        queryset = queryset.prefetch_related(
+            Prefetch("items", OrderItem.objects.select_related("product"))
+        )
+    elif "items_count" in fields:
+        queryset = queryset.prefetch_related("items")
+    order = get_object_or_404(queryset, id=id)
+    serializer = OrderDetailSerializer(order, fields=fields)
+    return set_validators(
+        APIResponse.success(serializer.data), etag, last_modified
+    )
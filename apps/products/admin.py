@@ -12,7 +12,8 @@ from .models import (
 
 @admin.register(Category)
 class CategoryAdmin(admin.ModelAdmin):
-    list_display = ["name", "slug", "created_at"]
+    list_display = ["name", "slug", "parent", "in_stock_count", "created_at"]
+    list_select_related = ["parent"]
     prepopulated_fields = {"slug": ("name",)}
     search_fields = ["name"]
 
@@ -26,7 +27,7 @@ class ProductImageInline(admin.TabularInline):
 class ProductAdmin(admin.ModelAdmin):
     list_display = ["title", "category", "price", "in_stock", "created_at"]
     list_filter = ["category", "in_stock", "created_at"]
-    search_fields = ["title", "description"]
+    search_fields = ["title", "description", "sku"]
     inlines = [ProductImageInline]
     readonly_fields = ["created_at", "updated_at"]
 
@@ -0,0 +1,74 @@
+import json
+from collections import defaultdict
+
+from django.conf import settings
+from django.db.models import Case, Count, IntegerField, Value, When
+
+from .models import ProductAttribute
+
+
+def category_facet(queryset):
+    rows = (
+        queryset.order_by()
+        .values("category_id", "category__name", "category__slug")
+        .annotate(count=Count("id"))
+        .order_by("-count", "category__name")
+    )
+    return [
+        {
+            "id": row["category_id"],
+            "name": row["category__name"],
+            "slug": row["category__slug"],
+            "count": row["count"],
+        }
+        for row in rows
+    ]
+
+
+def price_facet(queryset, edges=None):
+    edges = edges or settings.PRODUCT_FACET_PRICE_BUCKETS
+    bucket = Case(
+        *[
+            When(price__lt=edge, then=Value(index))
+            for index, edge in enumerate(edges)
+        ],
+        default=Value(len(edges)),
+        output_field=IntegerField(),
+    )
+    rows = (
+        queryset.order_by()
+        .annotate(bucket=bucket)
+        .values("bucket")
+        .annotate(count=Count("id"))
+    )
+    counts = {row["bucket"]: row["count"] for row in rows}
+    # Bucket 0 holds prices below the first edge
+    bounds = [None, *edges, None]
+    return [
+        {"min": bounds[index], "max": bounds[index + 1], "count": count}
+        for index, count in sorted(counts.items())
+    ]
+
+
+def attribute_facet(queryset):
+    rows = (
+        ProductAttribute.objects.filter(product__in=queryset.values("id"))
+        .values("key", "value")
+        .annotate(count=Count("id"))
+        .order_by("key", "-count", "value")
+    )
+    facet = defaultdict(list)
+    for row in rows:
+        facet[row["key"]].append(
+            {"value": json.loads(row["value"]), "count": row["count"]}
+        )
+    return dict(facet)
+
+
+def compute_facets(queryset):
+    """Category, price bucket and attribute value counts for a queryset"""
+    return {
+        "categories": category_facet(queryset),
+        "price": price_facet(queryset),
+        "attributes": attribute_facet(queryset),
+    }
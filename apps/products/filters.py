@@ -1,12 +1,21 @@
 import json
+from functools import reduce
+from operator import or_
 
 import django_filters
+from django.db import connections
+from django.db.models import Count, Q
 
-from .models import Product
+from .models import (
+    Category,
+    Product,
+    ProductAttribute,
+    indexed_attribute_values,
+)
 
 
 class ProductFilter(django_filters.FilterSet):
-    category = django_filters.NumberFilter(field_name="category__id")
+    category = django_filters.NumberFilter(method="filter_category")
     min_price = django_filters.NumberFilter(
         field_name="price", lookup_expr="gte"
     )
@@ -19,11 +28,53 @@ class ProductFilter(django_filters.FilterSet):
         model = Product
         fields = ["category", "min_price", "max_price", "attributes"]
 
+    def filter_category(self, queryset, name, value):
+        path = (
+            Category.objects.filter(pk=value)
+            .values_list("path", flat=True)
+            .first()
+        )
+        if not path:
+            return queryset.none()
+        # The category and its descendants, a prefix scan on the path index
+        return queryset.filter(category__path__startswith=path)
+
     def filter_attributes(self, queryset, name, value):
         try:
             attributes = json.loads(value)
-            for key, val in attributes.items():
+        except json.JSONDecodeError:
+            return queryset
+        if not attributes or not isinstance(attributes, dict):
+            return queryset
+
+        # Containment semantics: a list matches products holding all of
+        # its elements, a scalar products whose value is or holds it
+        features = connections[queryset.db].features
+        pairs = set()
+        for key, val in attributes.items():
+            if is_nested(val) and features.supports_json_field_contains:
+                # Partial objects are left to JSON containment
                 queryset = queryset.filter(attributes__contains={key: val})
-        except (json.JSONDecodeError, TypeError):
-            pass
-        return queryset
+                continue
+            pairs.update(
+                (key, encoded) for encoded in indexed_attribute_values(val)
+            )
+        if not pairs:
+            return queryset
+
+        # Products matching every pair, answered from the attribute index
+        matches = (
+            ProductAttribute.objects.filter(
+                reduce(or_, [Q(key=key, value=val) for key, val in pairs])
+            )
+            .values("product_id")
+            .annotate(matched=Count("id"))
+            .filter(matched=len(pairs))
+        )
+        return queryset.filter(id__in=matches.values("product_id"))
+
+
+def is_nested(value):
+    """Whether a filter value holds objects or lists below its top level"""
+    values = value if isinstance(value, list) else [value]
+    return any(isinstance(element, (dict, list)) for element in values)
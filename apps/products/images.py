@@ -0,0 +1,89 @@
+import io
+from pathlib import PurePosixPath
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from PIL import Image, ImageOps
+
+PIL_FORMATS = {"webp": "WEBP", "jpeg": "JPEG"}
+EXTENSIONS = {"webp": "webp", "jpeg": "jpg"}
+
+
+def variant_name(name, variant, image_format):
+    """Storage name of a variant, next to the original file"""
+    path = PurePosixPath(name)
+    return str(
+        path.with_name(f"{path.stem}.{variant}.{EXTENSIONS[image_format]}")
+    )
+
+
+def generate_variants(file):
+    """
+    Resize an image ``FieldFile`` into every configured variant.
+
+    Returns the mapping stored on the model,
+    ``{"source": name, variant: {format: name}}``; the source name tells
+    which upload the variants were made from.
+    """
+    storage = file.storage
+    with file.open("rb"):
+        with Image.open(file) as original:
+            image = ImageOps.exif_transpose(original)
+            image.load()
+
+    variants = {"source": file.name}
+    for variant, max_side in settings.PRODUCT_IMAGE_VARIANTS.items():
+        resized = image.copy()
+        # Only ever shrinks, small uploads keep their size
+        resized.thumbnail((max_side, max_side), Image.Resampling.LANCZOS)
+        variants[variant] = {}
+        for image_format in settings.PRODUCT_IMAGE_FORMATS:
+            buffer = io.BytesIO()
+            _convert(resized, image_format).save(
+                buffer,
+                PIL_FORMATS[image_format],
+                quality=settings.PRODUCT_IMAGE_QUALITY,
+            )
+            name = variant_name(file.name, variant, image_format)
+            storage.delete(name)
+            variants[variant][image_format] = storage.save(
+                name, ContentFile(buffer.getvalue())
+            )
+    return variants
+
+
+def delete_variants(variants, storage):
+    if getattr(storage, "content_addressed", False):
+        # Shared with other images of the same content, dedupe_media
+        # --prune removes the unreferenced ones
+        return
+    for variant, names in variants.items():
+        if variant != "source":
+            for name in names.values():
+                storage.delete(name)
+
+
+def variant_urls(variants, storage):
+    """``{variant: {format: url}}`` for the API"""
+    return {
+        variant: {
+            image_format: storage.url(name)
+            for image_format, name in names.items()
+        }
+        for variant, names in variants.items()
+        if variant != "source"
+    }
+
+
+def _convert(image, image_format):
+    if image_format == "jpeg":
+        if image.mode in ("RGBA", "LA", "PA") or "transparency" in image.info:
+            # JPEG has no alpha channel, flatten on white
+            image = image.convert("RGBA")
+            background = Image.new("RGB", image.size, "white")
+            background.paste(image, mask=image.getchannel("A"))
+            return background
+        return image.convert("RGB")
+    if image.mode not in ("RGB", "RGBA"):
+        return image.convert("RGBA")
+    return image
@@ -0,0 +1,349 @@
+from abc import ABC, abstractmethod
+from functools import lru_cache, reduce
+from operator import or_
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Q
+from django.utils.module_loading import import_string
+
+from apps.common.cache import bump_generation
+
+from .models import CATALOG_CACHE, Product, ProductLike
+from .search import chunked
+
+User = get_user_model()
+
+LIKED_IDS_KEY = "liked_ids:{user_id}"
+
+
+class BaseLikeStore(ABC):
+    """
+    Like toggles and the like state served to clients.
+
+    ``toggle`` returns ``(liked, likes_count)`` after the toggle,
+    ``liked_ids`` the ids of the products a user likes. Stores that defer
+    writes set ``writes_behind`` and persist them in ``flush``, until
+    then the ProductLike rows trail them; ``reconcile`` repairs counters
+    that drifted from the rows.
+    """
+
+    writes_behind = False
+
+    @abstractmethod
+    def toggle(self, user_id, product):
+        """Flip the like of ``user_id`` on ``product``"""
+
+    @abstractmethod
+    def liked_ids(self, user_id):
+        """Ids of the products ``user_id`` likes"""
+
+    def flush(self):
+        return 0
+
+    def reconcile(self):
+        return Product.objects.refresh_likes_counts()
+
+
+class DatabaseLikeStore(BaseLikeStore):
+    """Writes through to ProductLike, the signal handlers keep the counts"""
+
+    def toggle(self, user_id, product):
+        like, created = ProductLike.objects.get_or_create(
+            user_id=user_id, product=product
+        )
+        if not created:
+            like.delete()
+        product.refresh_from_db(fields=["likes_count"])
+        return created, product.likes_count
+
+    def liked_ids(self, user_id):
+        # Cached until the user's likes change, see forget_liked_ids()
+        key = LIKED_IDS_KEY.format(user_id=user_id)
+        liked = cache.get(key)
+        if liked is None:
+            liked = set(
+                ProductLike.objects.filter(user_id=user_id).values_list(
+                    "product_id", flat=True
+                )
+            )
+            cache.set(key, liked, settings.PRODUCT_LIKED_IDS_CACHE_TIMEOUT)
+        return liked
+
+
+class RedisLikeStore(BaseLikeStore):
+    """
+    Write-behind likes: toggles only touch Redis and are flushed in bulk.
+
+    Every user has a set of liked product ids and every product a like
+    counter, both loaded from the database on first use. A toggle flips
+    set membership and adjusts the counter in one script, then marks the
+    (user, product) pair and both keys dirty. Dirty keys never expire;
+    ``flush`` writes the current membership of every dirty pair to
+    ProductLike, recounts ``Product.likes_count`` for the products
+    involved and lets the flushed keys expire again.
+    """
+
+    writes_behind = True
+    prefix = "likes"
+    # Product id 0 never exists, it marks a loaded set of a user without
+    # likes, which Redis would otherwise not store
+    sentinel = 0
+    # Seconds clean keys are kept after their last flush or load
+    timeout = 60 * 60 * 24
+    batch_size = 500
+
+    toggle_script = """
+        if redis.call('EXISTS', KEYS[1]) == 0
+            or redis.call('EXISTS', KEYS[2]) == 0 then
+            return false
+        end
+        local liked = redis.call('SADD', KEYS[1], ARGV[1])
+        local delta = 1
+        if liked == 0 then
+            redis.call('SREM', KEYS[1], ARGV[1])
+            delta = -1
+        end
+        local count = redis.call('INCRBY', KEYS[2], delta)
+        redis.call('PERSIST', KEYS[1])
+        redis.call('PERSIST', KEYS[2])
+        redis.call('SADD', KEYS[3], ARGV[2])
+        redis.call('SADD', KEYS[4], KEYS[1], KEYS[2])
+        return {liked, count}
+    """
+    load_script = """
+        if redis.call('EXISTS', KEYS[1]) == 1 then
+            return 0
+        end
+        for i = 2, #ARGV do
+            redis.call('SADD', KEYS[1], ARGV[i])
+        end
+        redis.call('EXPIRE', KEYS[1], ARGV[1])
+        return 1
+    """
+    # Moves the dirty pairs and keys aside, merging with the leftovers of
+    # an interrupted flush
+    take_script = """
+        for i = 1, 2 do
+            if redis.call('EXISTS', KEYS[i]) == 1 then
+                redis.call('SUNIONSTORE', KEYS[i + 2], KEYS[i + 2], KEYS[i])
+                redis.call('DEL', KEYS[i])
+            end
+        end
+        return redis.call('SMEMBERS', KEYS[3])
+    """
+    # Keys toggled again since they were taken stay dirty
+    finish_script = """
+        local keys = redis.call('SMEMBERS', KEYS[2])
+        for _, key in ipairs(keys) do
+            if redis.call('SISMEMBER', KEYS[3], key) == 0 then
+                redis.call('EXPIRE', key, ARGV[1])
+            end
+        end
+        redis.call('DEL', KEYS[1], KEYS[2])
+        return #keys
+    """
+    # Clean keys have a timeout, dirty ones are left alone
+    evict_script = """
+        local evicted = 0
+        for _, key in ipairs(KEYS) do
+            if redis.call('TTL', key) > 0 then
+                evicted = evicted + redis.call('DEL', key)
+            end
+        end
+        return evicted
+    """
+
+    def __init__(self):
+        from django_redis import get_redis_connection
+
+        self.redis = get_redis_connection("default")
+        self.dirty_pairs = f"{self.prefix}:dirty:pairs"
+        self.dirty_keys = f"{self.prefix}:dirty:keys"
+        self.flushing_pairs = f"{self.prefix}:flushing:pairs"
+        self.flushing_keys = f"{self.prefix}:flushing:keys"
+        for name in ("toggle", "load", "take", "finish", "evict"):
+            script = getattr(self, f"{name}_script")
+            setattr(self, f"_{name}", self.redis.register_script(script))
+
+    def user_key(self, user_id):
+        return f"{self.prefix}:user:{user_id}"
+
+    def count_key(self, product_id):
+        return f"{self.prefix}:count:{product_id}"
+
+    def toggle(self, user_id, product):
+        keys = [
+            self.user_key(user_id),
+            self.count_key(product.pk),
+            self.dirty_pairs,
+            self.dirty_keys,
+        ]
+        args = [product.pk, f"{user_id}:{product.pk}"]
+        result = self._toggle(keys=keys, args=args)
+        if result is None:
+            self.load_user(user_id)
+            self.redis.set(
+                keys[1], product.likes_count, nx=True, ex=self.timeout
+            )
+            result = self._toggle(keys=keys, args=args)
+        liked, count = result
+        return bool(liked), max(count, 0)
+
+    def liked_ids(self, user_id):
+        key = self.user_key(user_id)
+        members = self.redis.smembers(key)
+        if not members:
+            self.load_user(user_id)
+            members = self.redis.smembers(key)
+        return {int(member) for member in members} - {self.sentinel}
+
+    def load_user(self, user_id):
+        product_ids = ProductLike.objects.filter(user_id=user_id).values_list(
+            "product_id", flat=True
+        )
+        self._load(
+            keys=[self.user_key(user_id)],
+            args=[self.timeout, self.sentinel, *product_ids],
+        )
+
+    def flush(self):
+        """Persist the dirty pairs, returns the number of pairs written"""
+        pairs = self._take(
+            keys=[
+                self.dirty_pairs,
+                self.dirty_keys,
+                self.flushing_pairs,
+                self.flushing_keys,
+            ]
+        )
+        pairs = [
+            tuple(int(part) for part in pair.split(b":")) for pair in pairs
+        ]
+        pipeline = self.redis.pipeline(transaction=False)
+        for user_id, product_id in pairs:
+            pipeline.exists(self.user_key(user_id))
+            pipeline.sismember(self.user_key(user_id), product_id)
+        replies = pipeline.execute()
+        # Pairs of evicted user sets have no known state, their
+        # ProductLike rows are left as they are
+        states = [
+            (user_id, product_id, bool(liked))
+            for (user_id, product_id), exists, liked in zip(
+                pairs, replies[::2], replies[1::2]
+            )
+            if exists
+        ]
+        apply_like_states(states, self.batch_size)
+        self._finish(
+            keys=[self.flushing_pairs, self.flushing_keys, self.dirty_keys],
+            args=[self.timeout],
+        )
+        return len(states)
+
+    def reconcile(self):
+        """
+        Flush, repair drifted counters and drop the clean Redis keys.
+
+        Dropped keys are loaded again from the repaired rows on next use.
+        """
+        self.flush()
+        repaired = super().reconcile()
+        for pattern in ("user", "count"):
+            keys = self.redis.scan_iter(
+                match=f"{self.prefix}:{pattern}:*", count=self.batch_size
+            )
+            for batch in chunked(keys, self.batch_size):
+                self._evict(keys=batch)
+        if repaired:
+            bump_generation(CATALOG_CACHE)
+        return repaired
+
+
+def forget_liked_ids(user_id):
+    cache.delete(LIKED_IDS_KEY.format(user_id=user_id))
+
+
+def mark_liked(products, user):
+    """
+    Set ``is_liked`` on product ``values()`` rows, dicts or instances.
+
+    The ids liked by ``user`` are read from the like store once for all
+    of them, so unflushed toggles show. ``likes_count`` stays the
+    database value, which trails a write-behind store until its flush.
+    """
+    liked = (
+        get_like_store().liked_ids(user.id) if user.is_authenticated else ()
+    )
+    for product in products:
+        if isinstance(product, dict):
+            product["is_liked"] = product["id"] in liked
+        else:
+            product.is_liked = product.id in liked
+
+
+def apply_like_states(states, batch_size=500):
+    """
+    Make ProductLike match ``(user_id, product_id, liked)`` states.
+
+    Pairs of deleted users or products are skipped. Rows are written
+    without signals, which would update the likes count once per row; the
+    likes counts of the products involved are recounted in one statement
+    instead.
+    """
+    if not states:
+        return
+    product_ids = {product_id for _, product_id, _ in states}
+    user_ids = {user_id for user_id, _, _ in states}
+    product_ids &= set(
+        Product.objects.filter(pk__in=product_ids).values_list("pk", flat=True)
+    )
+    user_ids &= set(
+        User.objects.filter(pk__in=user_ids).values_list("pk", flat=True)
+    )
+    states = [
+        state
+        for state in states
+        if state[0] in user_ids and state[1] in product_ids
+    ]
+
+    with transaction.atomic():
+        ProductLike.objects.bulk_create(
+            [
+                ProductLike(user_id=user_id, product_id=product_id)
+                for user_id, product_id, liked in states
+                if liked
+            ],
+            ignore_conflicts=True,
+            batch_size=batch_size,
+        )
+        unliked = [
+            Q(user_id=user_id, product_id=product_id)
+            for user_id, product_id, liked in states
+            if not liked
+        ]
+        for batch in chunked(unliked, batch_size):
+            unliked_rows = ProductLike.objects.filter(reduce(or_, batch))
+            unliked_rows._raw_delete(unliked_rows.db)
+        changed = Product.objects.filter(
+            pk__in=product_ids
+        ).refresh_likes_counts()
+        if changed:
+            transaction.on_commit(lambda: bump_generation(CATALOG_CACHE))
+    cache.delete_many(
+        [LIKED_IDS_KEY.format(user_id=user_id) for user_id in user_ids]
+    )
+
+
+@lru_cache
+def _load_store(path):
+    if path:
+        return import_string(path)()
+    return DatabaseLikeStore()
+
+
+def get_like_store():
+    """Store from PRODUCT_LIKE_STORE, the database store by default"""
+    return _load_store(settings.PRODUCT_LIKE_STORE)
@@ -0,0 +1,135 @@
+import posixpath
+
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from apps.products.models import Product, ProductImage
+
+# Model, image field and variants field of every product image reference
+IMAGE_FIELDS = [
+    (Product, "thumbnail", "thumbnail_variants"),
+    (ProductImage, "image", "variants"),
+]
+
+
+class Command(BaseCommand):
+    help = (
+        "Move product images to content-addressed names, pointing every "
+        "reference to a single copy of identical files"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Report what would change without touching anything",
+        )
+        parser.add_argument(
+            "--prune",
+            action="store_true",
+            help="Also delete files under the upload directories that no "
+            "image or variant references",
+        )
+
+    def handle(self, *args, **options):
+        storage = default_storage
+        if not getattr(storage, "content_addressed", False):
+            raise CommandError(
+                "The default storage is not content-addressed, configure "
+                "apps.common.storage.ContentAddressedStorage first"
+            )
+        self.storage = storage
+        self.dry_run = options["dry_run"]
+
+        renamed = {}
+        for model, field, _ in IMAGE_FIELDS:
+            names = (
+                model.objects.exclude(**{field: ""})
+                .values_list(field, flat=True)
+                .distinct()
+            )
+            for name in names.iterator():
+                if name not in renamed:
+                    renamed[name] = self.hashed_name(name)
+
+        moves = {
+            old: new for old, new in renamed.items() if new and old != new
+        }
+        freed = self.move(moves)
+        if options["prune"]:
+            freed += self.prune()
+
+        prefix = "Would free" if self.dry_run else "Freed"
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"{len(moves)} of {len(renamed)} files renamed to "
+                f"{len(set(moves.values()))} content-addressed files. "
+                f"{prefix} {freed} bytes"
+            )
+        )
+
+    def hashed_name(self, name):
+        try:
+            with self.storage.open(name) as file:
+                return self.storage.hashed_name(name, file)
+        except FileNotFoundError:
+            self.stderr.write(f"Missing file {name}, skipped")
+            return None
+
+    def move(self, moves):
+        """Copy files to their hashed names and repoint the references"""
+        freed, created = 0, set()
+        for old, new in moves.items():
+            if new in created or self.storage.exists(new):
+                # A duplicate, its bytes are already stored
+                freed += self.storage.size(old)
+            created.add(new)
+            if self.dry_run:
+                continue
+            with self.storage.open(old) as file:
+                self.storage.save(new, file)
+            with transaction.atomic():
+                for model, field, variants_field in IMAGE_FIELDS:
+                    rows = model.objects.filter(**{field: old})
+                    for pk, variants in rows.values_list("pk", variants_field):
+                        if variants.get("source") == old:
+                            # Same bytes, the variants stay valid
+                            variants["source"] = new
+                        model.objects.filter(pk=pk).update(
+                            **{field: new, variants_field: variants}
+                        )
+            self.storage.delete(old)
+        return freed
+
+    def prune(self):
+        """Delete files of the upload directories nobody references"""
+        referenced = set()
+        directories = set()
+        for model, field, variants_field in IMAGE_FIELDS:
+            directories.add(model._meta.get_field(field).upload_to)
+            rows = model.objects.values_list(field, variants_field)
+            for name, variants in rows.iterator():
+                referenced.add(name)
+                for variant, names in variants.items():
+                    if variant != "source":
+                        referenced.update(names.values())
+
+        freed = 0
+        for directory in directories:
+            for name in self.walk(directory.rstrip("/")):
+                if name in referenced:
+                    continue
+                freed += self.storage.size(name)
+                if not self.dry_run:
+                    self.storage.delete(name)
+        return freed
+
+    def walk(self, directory):
+        if not self.storage.exists(directory):
+            return
+        subdirectories, files = self.storage.listdir(directory)
+        for filename in files:
+            yield posixpath.join(directory, filename)
+        for subdirectory in subdirectories:
+            yield from self.walk(posixpath.join(directory, subdirectory))
@@ -0,0 +1,45 @@
+from django.core.management.base import BaseCommand
+
+from apps.products.models import Product, ProductImage
+from apps.products.tasks import (
+    generate_image_variants,
+    generate_thumbnail_variants,
+)
+
+
+class Command(BaseCommand):
+    help = "Generate missing product image variants"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--queue",
+            action="store_true",
+            help="Send the work to Celery instead of resizing in-process",
+        )
+
+    def handle(self, *args, **options):
+        jobs = [
+            (
+                generate_thumbnail_variants,
+                Product.objects.exclude(thumbnail="").filter(
+                    thumbnail_variants={}
+                ),
+            ),
+            (
+                generate_image_variants,
+                ProductImage.objects.filter(variants={}),
+            ),
+        ]
+        total = 0
+        for task, queryset in jobs:
+            for pk in queryset.values_list("pk", flat=True).iterator():
+                if options["queue"]:
+                    task.delay(pk)
+                else:
+                    task(pk)
+                total += 1
+
+        action = "Queued" if options["queue"] else "Generated"
+        self.stdout.write(
+            self.style.SUCCESS(f"{action} variants for {total} images")
+        )
@@ -0,0 +1,246 @@
+import csv
+import time
+from itertools import islice
+from pathlib import Path
+
+import orjson
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import CharField, F, Q, Value
+from django.db.models.fields.json import KT
+from django.db.models.functions import Cast, Concat
+
+from apps.common.cache import bump_generation
+from apps.products.images import delete_variants
+from apps.products.models import (
+    CATALOG_CACHE,
+    Category,
+    Product,
+    ProductAttribute,
+)
+from apps.products.search import get_search_backend
+from apps.products.suggest import SUGGEST_CACHE
+from apps.products.tasks import generate_thumbnail_variants
+
+# Counters and ratings are left alone, they belong to reviews and likes
+PRODUCT_UPDATE_FIELDS = [
+    "title",
+    "description",
+    "price",
+    "category",
+    "attributes",
+    "in_stock",
+    "thumbnail",
+    "updated_at",
+]
+TRUE_VALUES = {"1", "true", "t", "yes", "y"}
+FALSE_VALUES = {"0", "false", "f", "no", "n", ""}
+
+
+class Command(BaseCommand):
+    help = (
+        "Upsert categories, products and attributes from a CSV or JSONL "
+        "file, matching products on sku"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="CSV or JSONL file")
+        parser.add_argument(
+            "--format",
+            choices=["csv", "jsonl"],
+            help="Input format, guessed from the file extension by default",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=1000,
+            help="Rows written per transaction (default: 1000)",
+        )
+
+    def handle(self, *args, **options):
+        path = Path(options["path"])
+        if not path.is_file():
+            raise CommandError(f"{path} does not exist")
+        input_format = options["format"] or (
+            "csv" if path.suffix.lower() == ".csv" else "jsonl"
+        )
+        batch_size = options["batch_size"]
+        verbosity = options["verbosity"]
+
+        self.categories = {}
+        self.search_backend = get_search_backend()
+        imported = 0
+        started = time.monotonic()
+        rows = read_rows(path, input_format)
+        try:
+            while batch := list(islice(rows, batch_size)):
+                with transaction.atomic():
+                    imported += self.import_batch(path, batch)
+                if verbosity > 1:
+                    speed = rate(imported, started)
+                    self.stdout.write(f"{imported} rows, {speed:.0f} rows/s")
+        finally:
+            # bulk_create skips the signals that maintain the category
+            # counts and invalidate cached pages
+            if imported:
+                Category.objects.refresh_product_counts()
+                bump_generation(CATALOG_CACHE)
+                bump_generation(SUGGEST_CACHE)
+
+        elapsed = time.monotonic() - started
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Imported {imported} rows in {elapsed:.1f}s "
+                f"({rate(imported, started):.0f} rows/s)"
+            )
+        )
+
+    def import_batch(self, path, batch):
+        products = {}
+        categories = {}
+        for line, row in batch:
+            try:
+                product, slug, name = parse_row(row)
+            except KeyError as exc:
+                raise CommandError(f"{path}:{line}: missing {exc}")
+            except (TypeError, ValueError, ValidationError) as exc:
+                raise CommandError(f"{path}:{line}: {exc}")
+            # Within a batch the last row of a SKU wins
+            products[product.sku] = (product, slug)
+            if slug not in self.categories:
+                categories[slug] = name or categories.get(slug)
+
+        self.upsert_categories(categories)
+        for product, slug in products.values():
+            product.category_id = self.categories[slug]
+
+        saved = Product.objects.bulk_create(
+            [product for product, _ in products.values()],
+            update_conflicts=True,
+            unique_fields=["sku"],
+            update_fields=PRODUCT_UPDATE_FIELDS,
+        )
+        product_ids = [product.pk for product in saved]
+        ProductAttribute.objects.sync(saved)
+        self.search_backend.index_products(product_ids)
+        reset_thumbnail_variants(product_ids)
+        return len(batch)
+
+    def upsert_categories(self, categories):
+        """Create unseen categories, renaming the ones given a name"""
+        named = [
+            Category(slug=slug, name=name)
+            for slug, name in categories.items()
+            if name
+        ]
+        if named:
+            Category.objects.bulk_create(
+                named,
+                update_conflicts=True,
+                unique_fields=["slug"],
+                update_fields=["name", "updated_at"],
+            )
+        unnamed = [
+            Category(slug=slug, name=slug)
+            for slug, name in categories.items()
+            if not name
+        ]
+        if unnamed:
+            Category.objects.bulk_create(unnamed, ignore_conflicts=True)
+        # New categories are roots, bulk_create skips Category.save()
+        Category.objects.filter(path="").update(
+            path=Concat(Cast("id", CharField()), Value("/"))
+        )
+        self.categories.update(
+            Category.objects.filter(slug__in=categories).values_list(
+                "slug", "id"
+            )
+        )
+
+
+def reset_thumbnail_variants(product_ids):
+    """
+    Queue variants for thumbnails that have none of their own.
+
+    bulk_create skips the signals that do this on save: the variants of
+    a replaced thumbnail are cleared and deleted, new thumbnails and
+    replaced ones get generate_thumbnail_variants.
+    """
+    stale = dict(
+        Product.objects.filter(pk__in=product_ids)
+        .exclude(thumbnail="")
+        .annotate(source=KT("thumbnail_variants__source"))
+        .filter(Q(source__isnull=True) | ~Q(source=F("thumbnail")))
+        .values_list("pk", "thumbnail_variants")
+    )
+    if not stale:
+        return
+    replaced = [variants for variants in stale.values() if variants]
+    if replaced:
+        Product.objects.filter(pk__in=stale).update(thumbnail_variants={})
+    storage = Product._meta.get_field("thumbnail").storage
+
+    def regenerate():
+        for variants in replaced:
+            delete_variants(variants, storage)
+        for product_id in stale:
+            generate_thumbnail_variants.delay(product_id)
+
+    transaction.on_commit(regenerate)
+
+
+def read_rows(path, input_format):
+    """(line number, row dict) pairs, read lazily"""
+    with path.open(newline="", encoding="utf-8") as file:
+        if input_format == "csv":
+            # Line 1 is the header
+            yield from enumerate(csv.DictReader(file), start=2)
+            return
+        for line, text in enumerate(file, start=1):
+            if text.strip():
+                try:
+                    yield line, orjson.loads(text)
+                except orjson.JSONDecodeError as exc:
+                    raise CommandError(f"{path}:{line}: {exc}")
+
+
+def parse_row(row):
+    """Unsaved Product, category slug and optional category name of a row"""
+    sku = str(row["sku"]).strip()
+    if not sku:
+        raise ValueError("sku is required")
+    attributes = row.get("attributes") or {}
+    if isinstance(attributes, str):
+        attributes = orjson.loads(attributes)
+    if not isinstance(attributes, dict):
+        raise ValueError("attributes must be an object")
+
+    product = Product(
+        sku=sku,
+        title=row["title"],
+        description=row.get("description") or "",
+        price=Product._meta.get_field("price").to_python(row["price"]),
+        attributes=attributes,
+        in_stock=parse_bool(row.get("in_stock", True)),
+        thumbnail=row.get("thumbnail") or "",
+    )
+    slug = str(row["category"]).strip()
+    if not slug:
+        raise ValueError("category is required")
+    return product, slug, row.get("category_name")
+
+
+def parse_bool(value):
+    if isinstance(value, bool):
+        return value
+    value = str(value).strip().lower()
+    if value in TRUE_VALUES:
+        return True
+    if value in FALSE_VALUES:
+        return False
+    raise ValueError(f"{value!r} is not a boolean")
+
+
+def rate(rows, started):
+    return rows / max(time.monotonic() - started, 1e-9)
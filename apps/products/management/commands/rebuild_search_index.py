@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from apps.products.search import get_search_backend
+
+
+class Command(BaseCommand):
+    help = "Rebuild the product full-text search index"
+
+    def handle(self, *args, **options):
+        backend = get_search_backend()
+        with transaction.atomic():
+            backend.rebuild()
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Search index rebuilt with {type(backend).__name__}"
+            )
+        )
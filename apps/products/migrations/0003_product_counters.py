@@ -0,0 +1,54 @@
+# Generated by Django 5.2 on 2026-10-18 10:53
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+
+def populate_counters(apps, schema_editor):
+    Product = apps.get_model("products", "Product")
+    ProductLike = apps.get_model("products", "ProductLike")
+    Review = apps.get_model("reviews", "Review")
+
+    reviews = Review.objects.filter(product=OuterRef("pk")).values("product")
+    likes = ProductLike.objects.filter(product=OuterRef("pk")).values(
+        "product"
+    )
+    Product.objects.update(
+        reviews_count=Coalesce(
+            Subquery(reviews.annotate(n=Count("pk")).values("n")), Value(0)
+        ),
+        rating_sum=Coalesce(
+            Subquery(reviews.annotate(n=Sum("rating")).values("n")), Value(0)
+        ),
+        likes_count=Coalesce(
+            Subquery(likes.annotate(n=Count("pk")).values("n")), Value(0)
+        ),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("products", "0002_initial"),
+        ("reviews", "0002_initial"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="product",
+            name="likes_count",
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name="product",
+            name="rating_sum",
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name="product",
+            name="reviews_count",
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(populate_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,50 @@
+# Generated by Django 5.2 on 2026-10-18 10:53
+
+from django.db import migrations, models
+from django.db.models import F, FloatField, Value
+from django.db.models.functions import Cast, Coalesce, NullIf
+
+
+def populate_average_rating(apps, schema_editor):
+    Product = apps.get_model("products", "Product")
+    Product.objects.update(
+        average_rating=Coalesce(
+            Cast(F("rating_sum"), FloatField())
+            / NullIf(F("reviews_count"), Value(0)),
+            Value(0.0),
+        )
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("products", "0003_product_counters"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="product",
+            name="average_rating",
+            field=models.FloatField(default=0, editable=False),
+        ),
+        migrations.RunPython(
+            populate_average_rating, migrations.RunPython.noop
+        ),
+        migrations.AddIndex(
+            model_name="product",
+            index=models.Index(
+                condition=models.Q(("in_stock", True)),
+                fields=["average_rating", "id"],
+                name="product_rating_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="product",
+            index=models.Index(
+                condition=models.Q(("in_stock", True)),
+                fields=["likes_count", "id"],
+                name="product_popularity_idx",
+            ),
+        ),
+    ]
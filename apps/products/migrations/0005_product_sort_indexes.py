@@ -0,0 +1,29 @@
+# Generated by Django 5.2 on 2026-10-18 10:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("products", "0004_product_rating_sort"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="product",
+            index=models.Index(
+                condition=models.Q(("in_stock", True)),
+                fields=["created_at", "id"],
+                name="product_created_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="product",
+            index=models.Index(
+                condition=models.Q(("in_stock", True)),
+                fields=["price", "id"],
+                name="product_price_idx",
+            ),
+        ),
+    ]
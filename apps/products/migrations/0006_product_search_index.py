@@ -0,0 +1,53 @@
+# Generated by Django 5.2 on 2026-10-18 11:40
+
+from django.conf import settings
+from django.db import migrations
+
+
+def create_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == "postgresql":
+        schema_editor.execute(
+            "ALTER TABLE products_product ADD COLUMN search_vector tsvector"
+        )
+        schema_editor.execute(
+            "UPDATE products_product SET search_vector = "
+            "setweight(to_tsvector(%s::regconfig, coalesce(title, '')), 'A')"
+            " || setweight(to_tsvector(%s::regconfig, "
+            "coalesce(description, '')), 'B')",
+            [settings.PRODUCT_SEARCH_CONFIG, settings.PRODUCT_SEARCH_CONFIG],
+        )
+        schema_editor.execute(
+            "CREATE INDEX product_search_vector_idx ON products_product "
+            "USING GIN (search_vector)"
+        )
+    elif vendor == "sqlite":
+        schema_editor.execute(
+            "CREATE VIRTUAL TABLE products_product_fts USING fts5("
+            "title, description, tokenize='porter unicode61')"
+        )
+        schema_editor.execute(
+            "INSERT INTO products_product_fts (rowid, title, description) "
+            "SELECT id, title, description FROM products_product"
+        )
+
+
+def drop_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == "postgresql":
+        schema_editor.execute(
+            "ALTER TABLE products_product DROP COLUMN search_vector"
+        )
+    elif vendor == "sqlite":
+        schema_editor.execute("DROP TABLE products_product_fts")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("products", "0005_product_sort_indexes"),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
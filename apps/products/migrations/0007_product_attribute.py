@@ -0,0 +1,75 @@
+# Generated by Django 5.2 on 2026-10-18 10:58
+
+import json
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def populate_attributes(apps, schema_editor):
+    Product = apps.get_model("products", "Product")
+    ProductAttribute = apps.get_model("products", "ProductAttribute")
+
+    batch = []
+    products = Product.objects.exclude(attributes={}).values_list(
+        "id", "attributes"
+    )
+    for product_id, attributes in products.iterator(chunk_size=2000):
+        for key, value in (attributes or {}).items():
+            batch.append(
+                ProductAttribute(
+                    product_id=product_id,
+                    key=key,
+                    value=json.dumps(
+                        value, sort_keys=True, separators=(",", ":")
+                    ),
+                )
+            )
+        if len(batch) >= 2000:
+            ProductAttribute.objects.bulk_create(batch)
+            batch = []
+    ProductAttribute.objects.bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("products", "0006_product_search_index"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ProductAttribute",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("key", models.CharField(max_length=255)),
+                ("value", models.TextField()),
+                (
+                    "product",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="attribute_values",
+                        to="products.product",
+                    ),
+                ),
+            ],
+            options={
+                "indexes": [
+                    models.Index(
+                        fields=["key", "value", "product"],
+                        name="product_attribute_value_idx",
+                    )
+                ],
+                "unique_together": {("product", "key")},
+            },
+        ),
+        migrations.RunPython(populate_attributes, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.2 on 2026-10-18 11:09
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("products", "0007_product_attribute"),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name="product",
+            options={
+                "permissions": [
+                    ("export_product", "Can export the product catalog")
+                ]
+            },
+        ),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 5.2 on 2026-10-18 11:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("products", "0008_product_export_permission"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="product",
+            name="sku",
+            field=models.CharField(
+                blank=True, max_length=64, null=True, unique=True
+            ),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2 on 2026-10-18 11:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("products", "0009_product_sku"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="product",
+            name="thumbnail_variants",
+            field=models.JSONField(blank=True, default=dict, editable=False),
+        ),
+        migrations.AddField(
+            model_name="productimage",
+            name="variants",
+            field=models.JSONField(blank=True, default=dict, editable=False),
+        ),
+    ]
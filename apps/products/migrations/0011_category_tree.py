@@ -0,0 +1,66 @@
+# Generated by Django 5.2 on 2026-10-18 11:18
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import CharField, Count, Value
+from django.db.models.functions import Cast, Concat
+
+
+def populate_tree(apps, schema_editor):
+    Category = apps.get_model("products", "Category")
+    Product = apps.get_model("products", "Product")
+
+    # Existing categories are all roots
+    Category.objects.update(
+        path=Concat(Cast("id", CharField()), Value("/"))
+    )
+    counts = (
+        Product.objects.filter(in_stock=True)
+        .order_by()
+        .values("category_id")
+        .annotate(count=Count("id"))
+    )
+    for row in counts:
+        Category.objects.filter(pk=row["category_id"]).update(
+            in_stock_count=row["count"]
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("products", "0010_image_variants"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="category",
+            name="in_stock_count",
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name="category",
+            name="parent",
+            field=models.ForeignKey(
+                blank=True,
+                null=True,
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="children",
+                to="products.category",
+            ),
+        ),
+        migrations.AddField(
+            model_name="category",
+            name="path",
+            field=models.CharField(default="", editable=False, max_length=255),
+        ),
+        migrations.AddIndex(
+            model_name="category",
+            index=models.Index(
+                fields=["path"],
+                name="category_path_idx",
+                opclasses=["varchar_pattern_ops"],
+            ),
+        ),
+        migrations.RunPython(populate_tree, migrations.RunPython.noop),
+    ]
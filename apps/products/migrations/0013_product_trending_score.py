@@ -0,0 +1,26 @@
+# Generated by Django 5.2 on 2026-10-18 16:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("products", "0012_product_relation"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="product",
+            name="trending_score",
+            field=models.FloatField(default=0, editable=False),
+        ),
+        migrations.AddIndex(
+            model_name="product",
+            index=models.Index(
+                condition=models.Q(("in_stock", True)),
+                fields=["trending_score", "id"],
+                name="product_trending_idx",
+            ),
+        ),
+    ]
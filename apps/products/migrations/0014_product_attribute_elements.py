@@ -0,0 +1,60 @@
+# Generated by Django 5.2 on 2026-10-18 17:05
+
+import json
+
+from django.db import migrations, models
+
+
+def encode(value):
+    return json.dumps(value, sort_keys=True, separators=(",", ":"))
+
+
+def split_list_attributes(apps, schema_editor):
+    """Replace the whole-list rows with a row per list element"""
+    Product = apps.get_model("products", "Product")
+    ProductAttribute = apps.get_model("products", "ProductAttribute")
+
+    products = Product.objects.exclude(attributes={}).values_list(
+        "id", "attributes"
+    )
+    for product_id, attributes in products.iterator(chunk_size=2000):
+        for key, value in (attributes or {}).items():
+            if not isinstance(value, list):
+                continue
+            ProductAttribute.objects.filter(
+                product_id=product_id, key=key
+            ).delete()
+            ProductAttribute.objects.bulk_create(
+                [
+                    ProductAttribute(
+                        product_id=product_id, key=key, value=encoded
+                    )
+                    for encoded in sorted({encode(item) for item in value})
+                ]
+            )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("products", "0013_product_trending_score"),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name="productattribute",
+            name="product_attribute_value_idx",
+        ),
+        migrations.AlterUniqueTogether(
+            name="productattribute",
+            unique_together=set(),
+        ),
+        migrations.RunPython(split_list_attributes, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name="productattribute",
+            constraint=models.UniqueConstraint(
+                fields=("key", "value", "product"),
+                name="product_attribute_value_uniq",
+            ),
+        ),
+    ]
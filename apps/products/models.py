@@ -1,23 +1,287 @@
+import json
+from datetime import timedelta
+
+from django.conf import settings
 from django.contrib.auth import get_user_model
-from django.db import models
+from django.core.exceptions import ValidationError
+from django.db import connection, models, transaction
+from django.db.models import (
+    Case,
+    Count,
+    Exists,
+    F,
+    FloatField,
+    OuterRef,
+    Q,
+    Subquery,
+    Sum,
+    Value,
+    When,
+)
+from django.db.models.functions import Cast, Coalesce, Concat, NullIf, Substr
+from django.utils import timezone
 
 from apps.common.models import BaseModel
 
 User = get_user_model()
 
+# Cache namespace for responses and aggregates derived from the catalog
+CATALOG_CACHE = "catalog"
+
+
+def ancestor_ids(path):
+    """Ids on a materialized path, from the root down to the node itself"""
+    return [int(part) for part in path.split("/") if part]
+
+
+class CategoryQuerySet(models.QuerySet):
+    def subtree(self, path):
+        """The category with materialized ``path`` and its descendants"""
+        return self.filter(path__startswith=path)
+
+    def adjust_product_counts(self, ids, delta):
+        """Add ``delta`` to the in-stock counts of the categories ``ids``"""
+        categories = self.filter(pk__in=ids)
+        if delta < 0:
+            categories = categories.filter(in_stock_count__gte=-delta)
+        return categories.update(in_stock_count=F("in_stock_count") + delta)
+
+    def refresh_product_counts(self):
+        """Recalculate every subtree in-stock count from the products"""
+        direct = dict(
+            Product.objects.filter(in_stock=True)
+            .order_by()
+            .values("category_id")
+            .annotate(count=Count("id"))
+            .values_list("category_id", "count")
+        )
+        categories = list(self.only("id", "path", "in_stock_count"))
+        totals = dict.fromkeys((category.id for category in categories), 0)
+        for category in categories:
+            for ancestor_id in ancestor_ids(category.path):
+                if ancestor_id in totals:
+                    totals[ancestor_id] += direct.get(category.id, 0)
+
+        changed = []
+        for category in categories:
+            if category.in_stock_count != totals[category.id]:
+                category.in_stock_count = totals[category.id]
+                changed.append(category)
+        self.bulk_update(changed, ["in_stock_count"], batch_size=1000)
+        return len(changed)
+
 
 class Category(BaseModel):
     name = models.CharField(max_length=255)
     slug = models.SlugField(unique=True)
+    parent = models.ForeignKey(
+        "self",
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name="children",
+    )
+    # Ids from the root down to this category, "1/5/12/". Subtrees are
+    # prefix matches on this column.
+    path = models.CharField(max_length=255, editable=False, default="")
+    # In-stock products in this category and all of its descendants,
+    # maintained by the Product signal handlers
+    in_stock_count = models.PositiveIntegerField(default=0, editable=False)
+
+    objects = CategoryQuerySet.as_manager()
 
     class Meta:
         verbose_name_plural = "Categories"
+        indexes = [
+            models.Index(
+                fields=["path"],
+                name="category_path_idx",
+                # LIKE 'prefix%' index scans on PostgreSQL
+                opclasses=["varchar_pattern_ops"],
+            )
+        ]
 
     def __str__(self):
         return self.name
 
+    def clean(self):
+        if (
+            self.parent_id
+            and self.path
+            and self.parent.path.startswith(self.path)
+        ):
+            raise ValidationError(
+                {"parent": "A category cannot be moved below itself"}
+            )
+
+    @transaction.atomic
+    def save(self, *args, **kwargs):
+        # Paths and counts change through queries on other rows, the ones
+        # in the database win over this instance's
+        current = (
+            Category.objects.filter(pk=self.pk)
+            .values_list("path", flat=True)
+            .first()
+            if self.pk
+            else None
+        )
+        parent_path = (
+            Category.objects.filter(pk=self.parent_id)
+            .values_list("path", flat=True)
+            .get()
+            if self.parent_id
+            else ""
+        )
+        if current and parent_path.startswith(current):
+            raise ValueError("A category cannot be moved below itself")
+        if current is not None and kwargs.get("update_fields") is None:
+            kwargs["update_fields"] = [
+                field.name
+                for field in self._meta.concrete_fields
+                if not field.primary_key
+                and field.name not in ("path", "in_stock_count")
+            ]
+        super().save(*args, **kwargs)
+
+        self.path = current or ""
+        path = f"{parent_path}{self.pk}/"
+        if path != self.path:
+            self._move(path)
+
+    def _move(self, path):
+        old_path = self.path
+        if not old_path:
+            Category.objects.filter(pk=self.pk).update(path=path)
+            self.path = path
+            return
+
+        # Rewrite the subtree and carry its products to the new ancestors
+        Category.objects.subtree(old_path).update(
+            path=Concat(Value(path), Substr("path", len(old_path) + 1))
+        )
+        count = (
+            Category.objects.filter(pk=self.pk)
+            .values_list("in_stock_count", flat=True)
+            .get()
+        )
+        if count:
+            Category.objects.adjust_product_counts(
+                ancestor_ids(old_path)[:-1], -count
+            )
+            Category.objects.adjust_product_counts(
+                ancestor_ids(path)[:-1], count
+            )
+        self.path = path
+        self.in_stock_count = count
+
+
+def rating_average(rating_sum, reviews_count):
+    """Expression for the average rating, 0 for products without reviews"""
+    return Coalesce(
+        Cast(rating_sum, FloatField()) / NullIf(reviews_count, Value(0)),
+        Value(0.0),
+    )
+
+
+class ProductQuerySet(models.QuerySet):
+    def refresh_counters(self):
+        """Recalculate the denormalized counters from the source tables"""
+        from apps.reviews.models import Review
+
+        reviews = Review.objects.filter(product=OuterRef("pk")).values(
+            "product"
+        )
+        likes = ProductLike.objects.filter(product=OuterRef("pk")).values(
+            "product"
+        )
+        updated = self.update(
+            reviews_count=Coalesce(
+                Subquery(reviews.annotate(n=Count("pk")).values("n")),
+                Value(0),
+            ),
+            rating_sum=Coalesce(
+                Subquery(reviews.annotate(n=Sum("rating")).values("n")),
+                Value(0),
+            ),
+            likes_count=Coalesce(
+                Subquery(likes.annotate(n=Count("pk")).values("n")),
+                Value(0),
+            ),
+        )
+        self.update(
+            average_rating=rating_average(F("rating_sum"), F("reviews_count"))
+        )
+        return updated
+
+    def refresh_likes_counts(self):
+        """Repair ``likes_count`` where it differs from the ProductLike rows"""
+        likes = (
+            ProductLike.objects.filter(product=OuterRef("pk"))
+            .values("product")
+            .annotate(n=Count("pk"))
+            .values("n")
+        )
+        actual = Coalesce(Subquery(likes), Value(0))
+        return (
+            self.annotate(actual_likes=actual)
+            .exclude(likes_count=F("actual_likes"))
+            .update(likes_count=actual, updated_at=timezone.now())
+        )
+
+    def refresh_trending_scores(self, now=None):
+        """
+        Recalculate ``trending_score`` from recent likes, orders and reviews.
+
+        Every event within ``PRODUCT_TRENDING_WINDOW_DAYS`` counts its
+        source weight, halved every ``PRODUCT_TRENDING_HALF_LIFE_DAYS``
+        (decayed per whole day of age). One UPDATE covers the products
+        with recent events and those still holding a stale score.
+        """
+        from apps.orders.models import OrderItem
+        from apps.reviews.models import Review
+
+        now = now or timezone.now()
+        window = settings.PRODUCT_TRENDING_WINDOW_DAYS
+        half_life = settings.PRODUCT_TRENDING_HALF_LIFE_DAYS
+        weights = settings.PRODUCT_TRENDING_WEIGHTS
+        since = now - timedelta(days=window)
+        decay = Case(
+            *[
+                When(
+                    created_at__gte=now - timedelta(days=age + 1),
+                    then=Value(0.5 ** (age / half_life)),
+                )
+                for age in range(window)
+            ],
+            default=Value(0.0),
+            output_field=FloatField(),
+        )
+
+        sources = {
+            "likes": ProductLike.objects.all(),
+            "orders": OrderItem.objects.exclude(order__status="cancelled"),
+            "reviews": Review.objects.all(),
+        }
+        active = Q(trending_score__gt=0)
+        score = Value(0.0)
+        for name, events in sources.items():
+            events = events.filter(created_at__gte=since)
+            active |= Q(pk__in=events.values("product"))
+            decayed = (
+                events.filter(product=OuterRef("pk"))
+                .values("product")
+                .annotate(score=Sum(decay))
+                .values("score")
+            )
+            score += Coalesce(Subquery(decayed), Value(0.0)) * Value(
+                float(weights[name])
+            )
+        return self.filter(active).update(trending_score=score)
+
 
 class Product(BaseModel):
+    # Stable external identifier, the upsert key of import_products
+    sku = models.CharField(max_length=64, unique=True, null=True, blank=True)
     title = models.CharField(max_length=255)
     description = models.TextField()
     price = models.DecimalField(max_digits=10, decimal_places=2)
@@ -27,24 +291,55 @@ class Product(BaseModel):
     attributes = models.JSONField(default=dict, blank=True)
     in_stock = models.BooleanField(default=True)
     thumbnail = models.ImageField(upload_to="products/thumbnails/", blank=True)
+    # Resized copies of the thumbnail, see apps.products.images
+    thumbnail_variants = models.JSONField(
+        default=dict, blank=True, editable=False
+    )
 
-    def __str__(self):
-        return self.title
+    # Denormalized counters, maintained by the Review and ProductLike
+    # signal handlers. Use Product.objects.refresh_counters() to rebuild.
+    reviews_count = models.PositiveIntegerField(default=0, editable=False)
+    rating_sum = models.PositiveIntegerField(default=0, editable=False)
+    likes_count = models.PositiveIntegerField(default=0, editable=False)
+    average_rating = models.FloatField(default=0, editable=False)
+    # Time-decayed activity, see ProductQuerySet.refresh_trending_scores()
+    trending_score = models.FloatField(default=0, editable=False)
 
-    @property
-    def average_rating(self):
-        reviews = self.reviews.all()
-        if reviews:
-            return sum(review.rating for review in reviews) / len(reviews)
-        return 0
+    objects = ProductQuerySet.as_manager()
 
-    @property
-    def reviews_count(self):
-        return self.reviews.count()
+    class Meta:
+        # Partial indexes matching the in_stock=True catalog listing
+        indexes = [
+            models.Index(
+                fields=["average_rating", "id"],
+                condition=Q(in_stock=True),
+                name="product_rating_idx",
+            ),
+            models.Index(
+                fields=["likes_count", "id"],
+                condition=Q(in_stock=True),
+                name="product_popularity_idx",
+            ),
+            models.Index(
+                fields=["created_at", "id"],
+                condition=Q(in_stock=True),
+                name="product_created_idx",
+            ),
+            models.Index(
+                fields=["price", "id"],
+                condition=Q(in_stock=True),
+                name="product_price_idx",
+            ),
+            models.Index(
+                fields=["trending_score", "id"],
+                condition=Q(in_stock=True),
+                name="product_trending_idx",
+            ),
+        ]
+        permissions = [("export_product", "Can export the product catalog")]
 
-    @property
-    def likes_count(self):
-        return self.likes.count()
+    def __str__(self):
+        return self.title
 
     def is_liked_by(self, user):
         if user.is_authenticated:
@@ -52,11 +347,104 @@ class Product(BaseModel):
         return False
 
 
+def encode_attribute_value(value):
+    """Canonical JSON text of an attribute value, used for exact matching"""
+    return json.dumps(value, sort_keys=True, separators=(",", ":"))
+
+
+def indexed_attribute_values(value):
+    """
+    Encoded values stored in the attribute index for one attribute.
+
+    Lists are indexed per element so that a filter on some of the
+    elements matches, as JSON containment does; other values are indexed
+    whole.
+    """
+    values = value if isinstance(value, list) else [value]
+    return sorted({encode_attribute_value(element) for element in values})
+
+
+class ProductAttributeQuerySet(models.QuerySet):
+    def sync(self, products):
+        """Replace the attribute rows of ``products`` with their attributes"""
+        products = list(products)
+        self.filter(product__in=[product.pk for product in products]).delete()
+        return self.bulk_create(
+            [
+                ProductAttribute(product_id=product.pk, key=key, value=encoded)
+                for product in products
+                for key, value in (product.attributes or {}).items()
+                for encoded in indexed_attribute_values(value)
+            ],
+            batch_size=1000,
+        )
+
+
+class ProductAttribute(models.Model):
+    """
+    Normalized copy of Product.attributes, one row per key and value.
+
+    List values get a row per element. Kept in sync on Product save so
+    that attribute filters and facets can use the (key, value) index
+    instead of scanning the JSON column.
+    """
+
+    product = models.ForeignKey(
+        Product, on_delete=models.CASCADE, related_name="attribute_values"
+    )
+    key = models.CharField(max_length=255)
+    value = models.TextField()
+
+    objects = ProductAttributeQuerySet.as_manager()
+
+    class Meta:
+        constraints = [
+            # Also the index answering attribute filters and facets
+            models.UniqueConstraint(
+                fields=["key", "value", "product"],
+                name="product_attribute_value_uniq",
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.key}={self.value}"
+
+
+class ProductRelation(models.Model):
+    """
+    Products frequently bought together with ``product``, best first.
+
+    Rebuilt from order history by ``apps.orders.tasks``; ``score`` is the
+    number of orders containing both products.
+    """
+
+    product = models.ForeignKey(
+        Product, on_delete=models.CASCADE, related_name="relations"
+    )
+    related = models.ForeignKey(
+        Product, on_delete=models.CASCADE, related_name="bought_with"
+    )
+    rank = models.PositiveSmallIntegerField()
+    score = models.PositiveIntegerField()
+
+    class Meta:
+        constraints = [
+            # Also the index serving a product's list in rank order
+            models.UniqueConstraint(
+                fields=["product", "rank"], name="product_relation_rank_uniq"
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.product_id} -> {self.related_id} ({self.score})"
+
+
 class ProductImage(BaseModel):
     product = models.ForeignKey(
         Product, on_delete=models.CASCADE, related_name="images"
     )
     image = models.ImageField(upload_to="products/images/")
+    variants = models.JSONField(default=dict, blank=True, editable=False)
     order = models.PositiveIntegerField(default=0)
 
     class Meta:
@@ -79,6 +467,15 @@ class ProductLike(BaseModel):
         return f"{self.user.phone} likes {self.product.title}"
 
 
+def liked_by(user):
+    """Boolean expression telling whether ``user`` likes the product"""
+    if not user.is_authenticated:
+        return Value(False)
+    return Exists(
+        ProductLike.objects.filter(product=OuterRef("pk"), user=user)
+    )
+
+
 class Cart(BaseModel):
     user = models.OneToOneField(
         User, on_delete=models.CASCADE, related_name="cart"
@@ -96,6 +493,38 @@ class Cart(BaseModel):
         return sum(item.quantity for item in self.items.all())
 
 
+class CartItemQuerySet(models.QuerySet):
+    def add(self, cart, product_id, quantity):
+        """
+        Add ``quantity`` of an in-stock product to ``cart`` in one statement.
+
+        The item is inserted, or its quantity incremented in the database
+        when the cart already holds the product, so concurrent adds never
+        lose an increment. Returns the resulting quantity, or None when the
+        product does not exist or is out of stock.
+        """
+        quote = connection.ops.quote_name
+        items = quote(CartItem._meta.db_table)
+        now = connection.ops.adapt_datetimefield_value(timezone.now())
+        sql = f"""
+            INSERT INTO {items}
+                (cart_id, product_id, quantity, created_at, updated_at)
+            SELECT %s, id, %s, %s, %s
+            FROM {quote(Product._meta.db_table)}
+            WHERE id = %s AND in_stock = %s
+            ON CONFLICT (cart_id, product_id) DO UPDATE SET
+                quantity = {items}.quantity + excluded.quantity,
+                updated_at = excluded.updated_at
+            RETURNING quantity
+        """
+        with connection.cursor() as cursor:
+            cursor.execute(
+                sql, [cart.pk, quantity, now, now, product_id, True]
+            )
+            row = cursor.fetchone()
+        return row[0] if row else None
+
+
 class CartItem(BaseModel):
     cart = models.ForeignKey(
         Cart, on_delete=models.CASCADE, related_name="items"
@@ -103,6 +532,8 @@ class CartItem(BaseModel):
     product = models.ForeignKey(Product, on_delete=models.CASCADE)
     quantity = models.PositiveIntegerField(default=1)
 
+    objects = CartItemQuerySet.as_manager()
+
     class Meta:
         unique_together = ["cart", "product"]
 
@@ -0,0 +1,16 @@
+from rest_framework.permissions import BasePermission
+
+
+class CanExportCatalog(BasePermission):
+    """
+    Staff users and partner accounts granted ``products.export_product``
+    (directly or through a group).
+    """
+
+    def has_permission(self, request, view):
+        user = request.user
+        return bool(
+            user
+            and user.is_authenticated
+            and (user.is_staff or user.has_perm("products.export_product"))
+        )
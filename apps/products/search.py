@@ -0,0 +1,191 @@
+import re
+from abc import ABC, abstractmethod
+from functools import lru_cache
+from itertools import islice
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import BooleanField, FloatField, Q, Value
+from django.db.models.expressions import RawSQL
+from django.utils.module_loading import import_string
+
+from .models import Product
+
+PRODUCT_TABLE = Product._meta.db_table
+
+
+def chunked(items, size):
+    iterator = iter(items)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+
+class BaseSearchBackend(ABC):
+    """
+    Full-text search over product titles and descriptions.
+
+    ``search`` filters a Product queryset and annotates it with
+    ``search_rank`` (higher is more relevant). The index methods take
+    product ids so that callers can keep the index in sync in batches,
+    backends without an index of their own leave them as no-ops.
+    """
+
+    @abstractmethod
+    def search(self, queryset, query):
+        """Matching products of ``queryset``, annotated with search_rank"""
+
+    def index_products(self, product_ids):
+        pass
+
+    def remove_products(self, product_ids):
+        pass
+
+    def rebuild(self):
+        pass
+
+
+class DatabaseSearchBackend(BaseSearchBackend):
+    """Unindexed substring matching, used on unsupported databases"""
+
+    def search(self, queryset, query):
+        return queryset.filter(
+            Q(title__icontains=query) | Q(description__icontains=query)
+        ).annotate(search_rank=Value(0.0, output_field=FloatField()))
+
+
+class PostgresSearchBackend(BaseSearchBackend):
+    """
+    Ranked search on a ``search_vector`` tsvector column with a GIN index.
+
+    Titles are weighted above descriptions and stemming follows the
+    ``PRODUCT_SEARCH_CONFIG`` text search configuration.
+    """
+
+    vector_sql = (
+        "setweight(to_tsvector(%s::regconfig, coalesce(title, '')), 'A') || "
+        "setweight(to_tsvector(%s::regconfig, coalesce(description, '')), "
+        "'B')"
+    )
+    batch_size = 10000
+
+    def __init__(self):
+        self.config = settings.PRODUCT_SEARCH_CONFIG
+
+    def search(self, queryset, query):
+        column = f'"{PRODUCT_TABLE}"."search_vector"'
+        tsquery = "websearch_to_tsquery(%s::regconfig, %s)"
+        params = [self.config, query]
+        return queryset.filter(
+            RawSQL(
+                f"{column} @@ {tsquery}", params, output_field=BooleanField()
+            )
+        ).annotate(
+            search_rank=RawSQL(
+                f"ts_rank({column}, {tsquery})",
+                params,
+                output_field=FloatField(),
+            )
+        )
+
+    def index_products(self, product_ids):
+        with connection.cursor() as cursor:
+            for batch in chunked(product_ids, self.batch_size):
+                cursor.execute(
+                    f"UPDATE {PRODUCT_TABLE} "
+                    f"SET search_vector = {self.vector_sql} "
+                    "WHERE id = ANY(%s)",
+                    [self.config, self.config, batch],
+                )
+
+    def rebuild(self):
+        product_ids = Product.objects.values_list("id", flat=True)
+        self.index_products(product_ids.iterator())
+
+
+class SQLiteSearchBackend(BaseSearchBackend):
+    """
+    Ranked search on an FTS5 virtual table with the porter stemmer.
+
+    The table stores a copy of the title and description keyed by the
+    product id as rowid. Every query term is matched as a prefix.
+    """
+
+    fts_table = f"{PRODUCT_TABLE}_fts"
+    # SQLite limits the number of bound parameters per statement
+    batch_size = 500
+
+    def search(self, queryset, query):
+        terms = re.findall(r"\w+", query.lower())
+        if not terms:
+            return queryset.annotate(
+                search_rank=Value(0.0, output_field=FloatField())
+            ).none()
+        match = " ".join(f'"{term}"*' for term in terms)
+        return queryset.filter(
+            id__in=RawSQL(
+                f"SELECT rowid FROM {self.fts_table} "
+                f"WHERE {self.fts_table} MATCH %s",
+                [match],
+            )
+        ).annotate(
+            search_rank=RawSQL(
+                f"SELECT -bm25({self.fts_table}, 10.0, 1.0) "
+                f"FROM {self.fts_table} WHERE {self.fts_table} MATCH %s "
+                f'AND rowid = "{PRODUCT_TABLE}"."id"',
+                [match],
+                output_field=FloatField(),
+            )
+        )
+
+    def index_products(self, product_ids):
+        with connection.cursor() as cursor:
+            for batch in chunked(product_ids, self.batch_size):
+                placeholders = ", ".join(["%s"] * len(batch))
+                cursor.execute(
+                    f"DELETE FROM {self.fts_table} "
+                    f"WHERE rowid IN ({placeholders})",
+                    batch,
+                )
+                cursor.execute(
+                    f"INSERT INTO {self.fts_table} "
+                    "(rowid, title, description) "
+                    f"SELECT id, title, description FROM {PRODUCT_TABLE} "
+                    f"WHERE id IN ({placeholders})",
+                    batch,
+                )
+
+    def remove_products(self, product_ids):
+        with connection.cursor() as cursor:
+            for batch in chunked(product_ids, self.batch_size):
+                placeholders = ", ".join(["%s"] * len(batch))
+                cursor.execute(
+                    f"DELETE FROM {self.fts_table} "
+                    f"WHERE rowid IN ({placeholders})",
+                    batch,
+                )
+
+    def rebuild(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {self.fts_table}")
+            cursor.execute(
+                f"INSERT INTO {self.fts_table} (rowid, title, description) "
+                f"SELECT id, title, description FROM {PRODUCT_TABLE}"
+            )
+
+
+VENDOR_BACKENDS = {
+    "postgresql": PostgresSearchBackend,
+    "sqlite": SQLiteSearchBackend,
+}
+
+
+@lru_cache
+def _load_backend(path, vendor):
+    if path:
+        return import_string(path)()
+    return VENDOR_BACKENDS.get(vendor, DatabaseSearchBackend)()
+
+
+def get_search_backend():
+    """Backend from PRODUCT_SEARCH_BACKEND, or the one for the database"""
+    return _load_backend(settings.PRODUCT_SEARCH_BACKEND, connection.vendor)
@@ -1,8 +1,25 @@
+from django.core.files.storage import default_storage
+from django.db.models import Value
 from rest_framework import serializers
 
+from apps.common.fast_serializers import ValuesSerializer
+from apps.common.serializers import DynamicFieldsMixin
+
+from .images import variant_urls
 from .models import Cart, CartItem, Category, Product, ProductImage
 
 
+class ImageVariantsField(serializers.Field):
+    """URLs of resized image variants, ``{variant: {format: url}}``"""
+
+    def __init__(self, **kwargs):
+        kwargs["read_only"] = True
+        super().__init__(**kwargs)
+
+    def to_representation(self, value):
+        return variant_urls(value, default_storage)
+
+
 class CategorySerializer(serializers.ModelSerializer):
     class Meta:
         model = Category
@@ -15,10 +32,13 @@ class ProductImageSerializer(serializers.ModelSerializer):
         fields = ["image"]
 
 
-class ProductListSerializer(serializers.ModelSerializer):
+class ProductListSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     category = CategorySerializer(read_only=True)
+    thumbnail_variants = ImageVariantsField()
     average_rating = serializers.ReadOnlyField()
     likes_count = serializers.ReadOnlyField()
+    # Set by apps.products.likes.mark_liked
+    is_liked = serializers.BooleanField(read_only=True, default=False)
 
     class Meta:
         model = Product
@@ -27,15 +47,52 @@ class ProductListSerializer(serializers.ModelSerializer):
             "title",
             "price",
             "thumbnail",
+            "thumbnail_variants",
             "category",
             "average_rating",
             "likes_count",
+            "is_liked",
         ]
 
 
-class ProductDetailSerializer(serializers.ModelSerializer):
+# Renders the product list from values() rows, is_liked is False until
+# mark_liked() sets it for the requesting user
+product_list_values = ValuesSerializer(
+    ProductListSerializer, annotations={"is_liked": Value(False)}
+)
+
+
+class ProductExportSerializer(serializers.ModelSerializer):
+    category = serializers.CharField(source="category.slug")
+    average_rating = serializers.ReadOnlyField()
+    reviews_count = serializers.ReadOnlyField()
+    likes_count = serializers.ReadOnlyField()
+
+    class Meta:
+        model = Product
+        fields = [
+            "id",
+            "title",
+            "description",
+            "price",
+            "category",
+            "thumbnail",
+            "attributes",
+            "average_rating",
+            "reviews_count",
+            "likes_count",
+            "updated_at",
+        ]
+
+
+# Streams the catalog export from values() rows
+product_export_values = ValuesSerializer(ProductExportSerializer)
+
+
+class ProductDetailSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     category = CategorySerializer(read_only=True)
     images = serializers.SerializerMethodField()
+    image_variants = serializers.SerializerMethodField()
     average_rating = serializers.ReadOnlyField()
     reviews_count = serializers.ReadOnlyField()
     likes_count = serializers.ReadOnlyField()
@@ -49,6 +106,7 @@ class ProductDetailSerializer(serializers.ModelSerializer):
             "description",
             "price",
             "images",
+            "image_variants",
             "category",
             "attributes",
             "average_rating",
@@ -68,7 +126,23 @@ class ProductDetailSerializer(serializers.ModelSerializer):
             return [obj.thumbnail.url]
         return []
 
+    def get_image_variants(self, obj):
+        # Same order as images, empty until the variants are generated
+        images = obj.images.all()
+        if images:
+            return [
+                variant_urls(image.variants, image.image.storage)
+                for image in images
+            ]
+        elif obj.thumbnail:
+            return [
+                variant_urls(obj.thumbnail_variants, obj.thumbnail.storage)
+            ]
+        return []
+
     def get_is_liked(self, obj):
+        if hasattr(obj, "is_liked"):
+            return obj.is_liked
         request = self.context.get("request")
         if request and request.user.is_authenticated:
             return obj.is_liked_by(request.user)
@@ -103,12 +177,3 @@ class CartSerializer(serializers.ModelSerializer):
 class AddToCartSerializer(serializers.Serializer):
     product_id = serializers.IntegerField()
     quantity = serializers.IntegerField(min_value=1)
-
-    def validate_product_id(self, value):
-        try:
-            Product.objects.get(id=value, in_stock=True)
-        except Product.DoesNotExist:
-            raise serializers.ValidationError(
-                "Product not found or out of stock"
-            )
-        return value
@@ -0,0 +1,185 @@
+from django.db import transaction
+from django.db.models import F
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from apps.common.cache import bump_generation
+
+from .images import delete_variants
+from .likes import forget_liked_ids
+from .models import (
+    CATALOG_CACHE,
+    Category,
+    Product,
+    ProductAttribute,
+    ProductImage,
+    ProductLike,
+    ancestor_ids,
+)
+from .search import get_search_backend
+from .suggest import SUGGEST_CACHE
+from .tasks import generate_image_variants, generate_thumbnail_variants
+
+SEARCH_FIELDS = {"title", "description"}
+# Product fields that move it between category in-stock counts
+STOCK_FIELDS = {"category", "category_id", "in_stock"}
+# Product fields shown or ranked by the typeahead index
+SUGGEST_FIELDS = {"title", "in_stock", "likes_count"}
+# Image field and variants field of the models with image variants
+IMAGE_VARIANT_FIELDS = {
+    Product: ("thumbnail", "thumbnail_variants"),
+    ProductImage: ("image", "variants"),
+}
+
+
+@receiver(post_save, sender=Product)
+def index_product(sender, instance, update_fields, **kwargs):
+    if update_fields is None or SEARCH_FIELDS & set(update_fields):
+        get_search_backend().index_products([instance.pk])
+
+
+@receiver(post_save, sender=Product)
+def sync_product_attributes(sender, instance, update_fields, **kwargs):
+    if update_fields is None or "attributes" in update_fields:
+        ProductAttribute.objects.sync([instance])
+
+
+@receiver(post_delete, sender=Product)
+def unindex_product(sender, instance, **kwargs):
+    get_search_backend().remove_products([instance.pk])
+
+
+def adjust_category_counts(category_id, delta):
+    """Add ``delta`` to the in-stock count of a category and its ancestors"""
+    path = (
+        Category.objects.filter(pk=category_id)
+        .values_list("path", flat=True)
+        .first()
+    )
+    if path:
+        Category.objects.adjust_product_counts(ancestor_ids(path), delta)
+
+
+@receiver(pre_save, sender=Product)
+def remember_stock_state(sender, instance, update_fields, **kwargs):
+    instance._stock_state = None
+    if instance._state.adding or not (
+        update_fields is None or STOCK_FIELDS & set(update_fields)
+    ):
+        return
+    instance._stock_state = (
+        Product.objects.filter(pk=instance.pk)
+        .values_list("category_id", "in_stock")
+        .first()
+    )
+
+
+@receiver(post_save, sender=Product)
+def update_category_counts(sender, instance, created, **kwargs):
+    old = None if created else getattr(instance, "_stock_state", None)
+    if not created and old is None:
+        return
+    new = (instance.category_id, instance.in_stock)
+    if old == new:
+        return
+    if old and old[1]:
+        adjust_category_counts(old[0], -1)
+    if new[1]:
+        adjust_category_counts(new[0], 1)
+
+
+@receiver(post_delete, sender=Product)
+def decrement_category_counts(sender, instance, **kwargs):
+    if instance.in_stock:
+        adjust_category_counts(instance.category_id, -1)
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def invalidate_suggestions(sender, update_fields=None, **kwargs):
+    if (
+        sender is Category
+        or update_fields is None
+        or SUGGEST_FIELDS & set(update_fields)
+    ):
+        transaction.on_commit(lambda: bump_generation(SUGGEST_CACHE))
+
+
+@receiver(post_save, sender=ProductLike)
+@receiver(post_delete, sender=ProductLike)
+def invalidate_liked_ids(sender, instance, **kwargs):
+    forget_liked_ids(instance.user_id)
+
+
+@receiver(post_save, sender=ProductLike)
+def increment_likes_count(sender, instance, created, **kwargs):
+    if created:
+        Product.objects.filter(pk=instance.product_id).update(
+            likes_count=F("likes_count") + 1, updated_at=timezone.now()
+        )
+
+
+@receiver(post_delete, sender=ProductLike)
+def decrement_likes_count(sender, instance, **kwargs):
+    Product.objects.filter(pk=instance.product_id, likes_count__gt=0).update(
+        likes_count=F("likes_count") - 1, updated_at=timezone.now()
+    )
+
+
+@receiver(post_save, sender=ProductImage)
+@receiver(post_delete, sender=ProductImage)
+def touch_product(sender, instance, **kwargs):
+    # Image changes are changes of the product for conditional requests
+    Product.objects.filter(pk=instance.product_id).update(
+        updated_at=timezone.now()
+    )
+
+
+@receiver(pre_save, sender=Product)
+@receiver(pre_save, sender=ProductImage)
+def reset_image_variants(sender, instance, **kwargs):
+    field, variants_field = IMAGE_VARIANT_FIELDS[sender]
+    file = getattr(instance, field)
+    variants = getattr(instance, variants_field)
+    if variants and variants.get("source") != file.name:
+        # The image was replaced, its old variants are stale
+        setattr(instance, variants_field, {})
+        transaction.on_commit(lambda: delete_variants(variants, file.storage))
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_save, sender=ProductImage)
+def queue_image_variants(sender, instance, **kwargs):
+    field, variants_field = IMAGE_VARIANT_FIELDS[sender]
+    if getattr(instance, field) and not getattr(instance, variants_field):
+        task = (
+            generate_thumbnail_variants
+            if sender is Product
+            else generate_image_variants
+        )
+        transaction.on_commit(lambda: task.delay(instance.pk))
+
+
+@receiver(post_delete, sender=Product)
+@receiver(post_delete, sender=ProductImage)
+def delete_image_variants(sender, instance, **kwargs):
+    field, variants_field = IMAGE_VARIANT_FIELDS[sender]
+    variants = getattr(instance, variants_field)
+    if variants:
+        storage = getattr(instance, field).storage
+        transaction.on_commit(lambda: delete_variants(variants, storage))
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+@receiver(post_save, sender=ProductImage)
+@receiver(post_delete, sender=ProductImage)
+@receiver(post_save, sender=ProductLike)
+@receiver(post_delete, sender=ProductLike)
+def invalidate_catalog_cache(sender, **kwargs):
+    transaction.on_commit(lambda: bump_generation(CATALOG_CACHE))
@@ -0,0 +1,228 @@
+import heapq
+import pickle
+import threading
+import time
+import zlib
+from array import array
+from bisect import bisect_left
+from operator import itemgetter
+
+from django.conf import settings
+from django.core.cache import cache
+
+from apps.common.cache import get_generation
+
+from .models import Category, Product
+
+# Generation bumped when titles, category names or stock change
+SUGGEST_CACHE = "suggest"
+# Shared index snapshot, its generation, and the guard of queued builds
+SNAPSHOT_KEY = "suggest:snapshot"
+SNAPSHOT_GENERATION_KEY = "suggest:snapshot:generation"
+BUILD_QUEUED_KEY = "suggest:build-queued"
+# Prefixes matching more entries have their suggestions precomputed
+SCAN_LIMIT = 1000
+LAST_CHARACTER = chr(0x10FFFF)
+KINDS = ("category", "product")
+
+_key = itemgetter(0)
+
+
+def normalize(text):
+    """Lowercased text with collapsed whitespace, the index key"""
+    return " ".join(text.casefold().split())
+
+
+class SuggestionIndex:
+    """
+    Sorted in-memory prefix index of product titles and category names.
+
+    Built from ``(key, rank, type, id, text)`` entries sorted by key, so the
+    entries starting with a prefix are one contiguous slice found by
+    binary search. ``rank`` sorts the most popular entries first. Prefixes
+    matching more than ``SCAN_LIMIT`` entries have their best ``limit``
+    suggestions computed when the index is built, so no query ranks more
+    than ``SCAN_LIMIT`` entries. Entries are kept in parallel arrays
+    rather than a tuple each, which keeps large catalogs small in every
+    process and in the shared snapshot.
+    """
+
+    def __init__(self, entries, limit):
+        entries = sorted(entries, key=_key)
+        self.keys = [entry[0] for entry in entries]
+        self.texts = [entry[4] for entry in entries]
+        self.kinds = bytes(KINDS.index(entry[2]) for entry in entries)
+        self.ids = array("q", [entry[3] for entry in entries])
+        # Position of every entry in popularity order
+        self.ranks = array("q", bytes(8 * len(entries)))
+        by_rank = sorted(range(len(entries)), key=lambda i: entries[i][1])
+        for position, i in enumerate(by_rank):
+            self.ranks[i] = position
+        self.limit = limit
+        self.top = {}
+        # Slices of entries sharing a prefix of the given length
+        slices = [(0, len(self.keys), 0)]
+        while slices:
+            start, end, length = slices.pop()
+            while start < end:
+                key = self.keys[start]
+                if len(key) <= length:
+                    start += 1
+                    continue
+                prefix = key[: length + 1]
+                stop = self.prefix_end(prefix, start, end)
+                if stop - start > SCAN_LIMIT:
+                    self.top[prefix] = self.best(start, stop, limit)
+                    slices.append((start, stop, length + 1))
+                start = stop
+
+    def __len__(self):
+        return len(self.keys)
+
+    def best(self, start, end, limit):
+        """Positions of the ``limit`` best entries of a slice"""
+        return array(
+            "q",
+            heapq.nsmallest(
+                limit, range(start, end), key=self.ranks.__getitem__
+            ),
+        )
+
+    def suggestion(self, position):
+        return {
+            "type": KINDS[self.kinds[position]],
+            "id": self.ids[position],
+            "text": self.texts[position],
+        }
+
+    def suggest(self, query, limit=None):
+        limit = min(limit or self.limit, self.limit)
+        prefix = normalize(query)
+        if not prefix:
+            return []
+        if prefix in self.top:
+            positions = self.top[prefix][:limit]
+        else:
+            start = bisect_left(self.keys, prefix)
+            end = self.prefix_end(prefix, start, len(self.keys))
+            positions = self.best(start, end, limit)
+        return [self.suggestion(position) for position in positions]
+
+    def prefix_end(self, prefix, start, end):
+        """End of the slice of keys starting with ``prefix`` at ``start``"""
+        # Sorts after every key starting with the prefix
+        return bisect_left(self.keys, prefix + LAST_CHARACTER, start, end)
+
+    @classmethod
+    def build(cls):
+        """Index every in-stock product title and category name"""
+        entries = []
+        categories = Category.objects.filter(in_stock_count__gt=0)
+        for id, name, count in categories.values_list(
+            "id", "name", "in_stock_count"
+        ):
+            # Categories rank before products of the same popularity
+            entries.append(
+                (normalize(name), (-count, 0, name), "category", id, name)
+            )
+
+        products = Product.objects.filter(in_stock=True).values_list(
+            "id", "title", "likes_count"
+        )
+        for id, title, likes in products.iterator(chunk_size=10000):
+            entries.append(
+                (normalize(title), (-likes, 1, title), "product", id, title)
+            )
+        return cls(entries, settings.PRODUCT_SUGGEST_LIMIT)
+
+
+def publish_suggestion_index():
+    """
+    Build the index and share it with every process through the cache.
+
+    Skipped while the shared snapshot is of the current catalog
+    generation, returns whether a new snapshot was published. Runs in the
+    ``refresh_suggestion_index`` task, never in a request.
+    """
+    generation = get_generation(SUGGEST_CACHE)
+    if cache.get(SNAPSHOT_GENERATION_KEY) == generation and cache.has_key(
+        SNAPSHOT_KEY
+    ):
+        return False
+    index = SuggestionIndex.build()
+    data = zlib.compress(pickle.dumps(index, pickle.HIGHEST_PROTOCOL))
+    cache.set(SNAPSHOT_KEY, (generation, data), timeout=None)
+    cache.set(SNAPSHOT_GENERATION_KEY, generation, timeout=None)
+    cache.delete(BUILD_QUEUED_KEY)
+    return True
+
+
+_lock = threading.Lock()
+_state = {"index": None, "generation": None, "checked_at": None}
+_loading = threading.Event()
+
+
+def load_suggestion_index():
+    """Swap in the shared snapshot, returns whether there was one"""
+    snapshot = cache.get(SNAPSHOT_KEY)
+    if snapshot is None:
+        return False
+    generation, data = snapshot
+    index = pickle.loads(zlib.decompress(data))
+    with _lock:
+        _state["index"] = index
+        _state["generation"] = generation
+    return True
+
+
+def _load_in_background():
+    def load():
+        try:
+            load_suggestion_index()
+        finally:
+            _loading.clear()
+
+    _loading.set()
+    threading.Thread(target=load, name="suggest-loader", daemon=True).start()
+
+
+def _queue_build():
+    from .tasks import refresh_suggestion_index
+
+    # One build for all the processes that find no snapshot
+    timeout = max(settings.PRODUCT_SUGGEST_REFRESH_INTERVAL, 1)
+    if cache.add(BUILD_QUEUED_KEY, True, timeout=timeout):
+        refresh_suggestion_index.delay()
+
+
+def get_suggestion_index():
+    """
+    This process's copy of the shared index.
+
+    At most every ``PRODUCT_SUGGEST_REFRESH_INTERVAL`` seconds the
+    generation of the shared snapshot is checked. A newer snapshot is
+    loaded by a background thread while the current index keeps
+    answering, so suggestions may lag behind edits by the interval plus
+    the next build. Until a first snapshot is published the index is
+    empty and a build is queued.
+    """
+    now = time.monotonic()
+    with _lock:
+        index = _state["index"]
+        checked_at = _state["checked_at"]
+        due = not _loading.is_set() and (
+            checked_at is None
+            or now - checked_at >= settings.PRODUCT_SUGGEST_REFRESH_INTERVAL
+        )
+        if due:
+            _state["checked_at"] = now
+
+    if due:
+        generation = cache.get(SNAPSHOT_GENERATION_KEY)
+        if generation is None:
+            _queue_build()
+        elif generation != _state["generation"]:
+            _load_in_background()
+    if index is None:
+        return SuggestionIndex([], settings.PRODUCT_SUGGEST_LIMIT)
+    return index
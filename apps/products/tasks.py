@@ -0,0 +1,74 @@
+from celery import shared_task
+from django.utils import timezone
+
+from apps.common.cache import bump_generation
+
+from .images import delete_variants, generate_variants
+from .likes import get_like_store
+from .models import CATALOG_CACHE, Product, ProductImage
+from .suggest import publish_suggestion_index
+
+
+@shared_task
+def generate_thumbnail_variants(product_id):
+    """Resize ``Product.thumbnail`` into its variants"""
+    return _generate(Product, product_id, "thumbnail", "thumbnail_variants")
+
+
+@shared_task
+def generate_image_variants(image_id):
+    """Resize ``ProductImage.image`` into its variants"""
+    return _generate(ProductImage, image_id, "image", "variants")
+
+
+@shared_task
+def flush_product_likes():
+    """Persist the like toggles buffered by the like store"""
+    return get_like_store().flush()
+
+
+@shared_task
+def reconcile_product_likes():
+    """Repair like counters that drifted from the ProductLike rows"""
+    return get_like_store().reconcile()
+
+
+@shared_task
+def refresh_suggestion_index():
+    """Publish a new typeahead index snapshot after catalog changes"""
+    return publish_suggestion_index()
+
+
+@shared_task
+def refresh_trending_scores():
+    """Periodic recalculation of the trending product scores"""
+    updated = Product.objects.refresh_trending_scores()
+    # Trending sorts and lists are cached catalog responses
+    bump_generation(CATALOG_CACHE)
+    return updated
+
+
+def _generate(model, pk, field, variants_field):
+    instance = model.objects.filter(pk=pk).first()
+    if instance is None:
+        return False
+    file = getattr(instance, field)
+    if (
+        not file
+        or getattr(instance, variants_field).get("source") == file.name
+    ):
+        return False
+
+    variants = generate_variants(file)
+    # Only store them if the image was not replaced in the meantime
+    updated = model.objects.filter(pk=pk, **{field: file.name}).update(
+        **{variants_field: variants}
+    )
+    if not updated:
+        delete_variants(variants, file.storage)
+        return False
+
+    product_id = pk if model is Product else instance.product_id
+    Product.objects.filter(pk=product_id).update(updated_at=timezone.now())
+    bump_generation(CATALOG_CACHE)
+    return True
@@ -1,3 +1,1706 @@
-from django.test import TestCase
+import csv
+import io
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+from datetime import timedelta
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.auth.models import Permission
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage, default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from PIL import Image
+from rest_framework.test import APIClient
+
+from apps.common.cache import make_versioned_key
+from apps.orders.models import Order, OrderItem
+from apps.orders.tasks import rebuild_product_relations
+from apps.reviews.models import Review
+from apps.users.models import User
+
+from . import suggest
+from .likes import (
+    BaseLikeStore,
+    DatabaseLikeStore,
+    RedisLikeStore,
+    apply_like_states,
+    get_like_store,
+)
+from .models import (
+    CATALOG_CACHE,
+    Cart,
+    CartItem,
+    Category,
+    Product,
+    ProductImage,
+    ProductLike,
+)
+from .search import BaseSearchBackend, get_search_backend
+from .serializers import ProductListSerializer
+from .suggest import (
+    SuggestionIndex,
+    get_suggestion_index,
+    load_suggestion_index,
+    publish_suggestion_index,
+)
+from .tasks import generate_image_variants, generate_thumbnail_variants
+
+LOCMEM_CACHES = {
+    "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}
+}
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class ProductDetailQueryTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name="Phones", slug="phones")
+        cls.product = Product.objects.create(
+            title="Phone",
+            description="A phone",
+            price="499.00",
+            category=category,
+        )
+        for order in range(5):
+            ProductImage.objects.create(
+                product=cls.product,
+                image=f"products/images/phone-{order}.jpg",
+                order=order,
+            )
+        cls.user = User.objects.create(phone="+998900000001")
+        ProductLike.objects.create(user=cls.user, product=cls.product)
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.url = reverse("product_detail", args=[self.product.id])
+
+    def test_anonymous_detail_query_budget(self):
+        # Product with category and is_liked, then the images
+        with self.assertNumQueries(2):
+            response = self.client.get(self.url)
+
+        data = response.json()["data"]
+        self.assertEqual(len(data["images"]), 5)
+        self.assertEqual(data["likes_count"], 1)
+        self.assertFalse(data["is_liked"])
+
+    def test_authenticated_detail_query_budget(self):
+        self.client.force_authenticate(self.user)
+        with self.assertNumQueries(2):
+            response = self.client.get(self.url)
+
+        self.assertTrue(response.json()["data"]["is_liked"])
+
+    def test_not_modified_skips_images(self):
+        etag = self.client.get(self.url)["ETag"]
+        cache.clear()
+
+        with self.assertNumQueries(1):
+            response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(response.status_code, 304)
+
+    def test_sparse_fieldset_skips_joins(self):
+        # Neither the category join, the like lookup nor the images
+        with self.assertNumQueries(1):
+            response = self.client.get(
+                self.url,
+                {"fields": "id,title,category", "exclude": "category"},
+            )
+
+        self.assertEqual(
+            response.json()["data"],
+            {"id": self.product.id, "title": "Phone"},
+        )
+
+    def test_sparse_fieldset_changes_etag(self):
+        full = self.client.get(self.url)
+        sparse = self.client.get(self.url, {"fields": "id,title"})
+
+        self.assertNotEqual(full["ETag"], sparse["ETag"])
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class ProductSortTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.category = Category.objects.create(name="Phones", slug="phones")
+        users = [
+            User.objects.create(phone=f"+99890000000{index}")
+            for index in range(3)
+        ]
+        # Title, ratings and number of likes
+        for title, ratings, likes in [
+            ("A", [5], 1),
+            ("B", [4, 2], 3),
+            ("C", [], 2),
+            ("D", [3], 0),
+        ]:
+            product = Product.objects.create(
+                title=title,
+                description=title,
+                price="1.00",
+                category=cls.category,
+            )
+            for user, rating in zip(users, ratings):
+                Review.objects.create(
+                    user=user, product=product, rating=rating
+                )
+            for user in users[:likes]:
+                ProductLike.objects.create(user=user, product=product)
+
+    def setUp(self):
+        cache.clear()
+
+    def titles(self, **params):
+        response = self.client.get(reverse("product_list"), params)
+        self.assertEqual(response.status_code, 200)
+        return [product["title"] for product in response.data["data"]]
+
+    def test_sort_by_rating_and_popularity(self):
+        # Ties on the sort value are ordered by id in the same direction
+        self.assertEqual(self.titles(sort="rating"), ["C", "B", "D", "A"])
+        self.assertEqual(
+            self.titles(sort="rating", order="desc"), ["A", "D", "B", "C"]
+        )
+        self.assertEqual(self.titles(sort="popularity"), ["D", "A", "C", "B"])
+        self.assertEqual(
+            self.titles(sort="popularity", order="desc"),
+            ["B", "C", "A", "D"],
+        )
+        for sort in ("rating", "popularity"):
+            with self.subTest(sort=sort):
+                self.assertEqual(
+                    self.titles(sort=sort, cursor=""),
+                    self.titles(sort=sort),
+                )
+
+    def test_unknown_sort_is_rejected(self):
+        response = self.client.get(reverse("product_list"), {"sort": "likes"})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("sort", response.data["error"]["details"])
+
+    def test_list_query_count_is_constant(self):
+        url = reverse("product_list")
+        params = {"sort": "rating", "order": "desc"}
+        # The count and the page, with the counters read from the rows
+        with self.assertNumQueries(2):
+            self.client.get(url, params)
+
+        Product.objects.bulk_create(
+            [
+                Product(
+                    title=f"Phone {index}",
+                    description="Phone",
+                    price="1.00",
+                    category=self.category,
+                    average_rating=index % 5,
+                    likes_count=index,
+                )
+                for index in range(40)
+            ]
+        )
+        cache.clear()
+        with self.assertNumQueries(2):
+            response = self.client.get(url, params)
+        self.assertEqual(len(response.data["data"]), 20)
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class SearchBackendTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.category = Category.objects.create(name="Shoes", slug="shoes")
+        cls.runner, cls.trail, cls.boot = [
+            Product.objects.create(
+                title=title,
+                description=description,
+                price="1.00",
+                category=cls.category,
+            )
+            for title, description in [
+                ("Running shoes", "Light shoes for the road"),
+                ("Trail sneakers", "Grippy soles for running off road"),
+                ("Winter boots", "Warm lining"),
+            ]
+        ]
+
+    def setUp(self):
+        cache.clear()
+        self.backend = get_search_backend()
+
+    def search(self, query):
+        queryset = self.backend.search(Product.objects.all(), query)
+        return list(
+            queryset.order_by("-search_rank", "id").values_list(
+                "title", flat=True
+            )
+        )
+
+    def test_stemming_and_rank(self):
+        # "runs" and "running" share the stem, title matches rank first
+        self.assertEqual(
+            self.search("runs"), ["Running shoes", "Trail sneakers"]
+        )
+        self.assertEqual(self.search("boot"), ["Winter boots"])
+        self.assertEqual(self.search("sandals"), [])
+
+    def test_backends_must_implement_search(self):
+        class IndexOnlyBackend(BaseSearchBackend):
+            def index_products(self, product_ids):
+                pass
+
+        with self.assertRaises(TypeError):
+            IndexOnlyBackend()
+
+    @unittest.skipUnless(connection.vendor == "sqlite", "FTS5 prefixes")
+    def test_terms_match_as_prefixes(self):
+        self.assertEqual(self.search("sneak"), ["Trail sneakers"])
+        self.assertEqual(self.search("win lin"), ["Winter boots"])
+        self.assertEqual(self.search("!!"), [])
+
+    def test_index_follows_saves_and_deletes(self):
+        self.boot.title = "Winter galoshes"
+        self.boot.save()
+        self.assertEqual(self.search("galoshes"), ["Winter galoshes"])
+        self.assertEqual(self.search("boots"), [])
+
+        # Saves that leave the text alone do not touch the index
+        with mock.patch.object(self.backend, "index_products") as index:
+            self.boot.save(update_fields=["price"])
+        index.assert_not_called()
+
+        product_id = self.boot.pk
+        with mock.patch.object(self.backend, "remove_products") as remove:
+            self.boot.delete()
+        remove.assert_called_once_with([product_id])
+
+    @unittest.skipUnless(connection.vendor == "sqlite", "FTS5 table")
+    def test_deleted_products_leave_the_index(self):
+        table = self.backend.fts_table
+        with connection.cursor() as cursor:
+            cursor.execute(f"SELECT COUNT(*) FROM {table}")
+            self.assertEqual(cursor.fetchone()[0], 3)
+            self.trail.delete()
+            cursor.execute(f"SELECT rowid FROM {table} ORDER BY rowid")
+            self.assertEqual(
+                [row[0] for row in cursor.fetchall()],
+                [self.runner.pk, self.boot.pk],
+            )
+
+    def test_rebuild_command_indexes_bulk_created_products(self):
+        # bulk_create skips the signals that keep the index in sync
+        Product.objects.bulk_create(
+            [
+                Product(
+                    title="Hiking sandals",
+                    description="Open",
+                    price="1.00",
+                    category=self.category,
+                )
+            ]
+        )
+        self.assertEqual(self.search("sandals"), [])
+        call_command("rebuild_search_index", stdout=io.StringIO())
+        self.assertEqual(self.search("sandals"), ["Hiking sandals"])
+        self.assertEqual(
+            self.search("running"), ["Running shoes", "Trail sneakers"]
+        )
+
+    def test_relevance_sort_with_cursor(self):
+        url = reverse("product_list")
+        params = {"search": "running road", "limit": 1, "cursor": ""}
+        titles = []
+        while params["cursor"] is not None:
+            response = self.client.get(url, params)
+            self.assertEqual(response.status_code, 200)
+            titles += [item["title"] for item in response.data["data"]]
+            params["cursor"] = response.data["meta"]["pagination"]["cursors"][
+                "next"
+            ]
+        self.assertEqual(titles, self.search("running road"))
+        self.assertEqual(len(titles), 2)
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class ProductFacetTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.electronics = Category.objects.create(
+            name="Electronics", slug="electronics"
+        )
+        cls.phones = Category.objects.create(
+            name="Phones", slug="phones", parent=cls.electronics
+        )
+        cls.books = Category.objects.create(name="Books", slug="books")
+        for title, category, price, attributes, in_stock in [
+            ("Phone A", cls.phones, "10.00", {"color": "black"}, True),
+            ("Phone B", cls.phones, "30.00", {"color": "white"}, True),
+            ("Phone C", cls.phones, "45.00", {"color": "black"}, True),
+            ("Radio", cls.electronics, "700.00", {"color": "black"}, True),
+            ("Novel", cls.books, "30.00", {"cover": "soft"}, True),
+            ("Phone D", cls.phones, "30.00", {"color": "red"}, False),
+        ]:
+            Product.objects.create(
+                title=title,
+                description=title,
+                price=price,
+                category=category,
+                attributes=attributes,
+                in_stock=in_stock,
+            )
+
+    def setUp(self):
+        cache.clear()
+        self.url = reverse("product_facets")
+
+    def test_counts_under_a_filter(self):
+        response = self.client.get(self.url, {"category": self.electronics.id})
+        facets = response.data["data"]
+        self.assertEqual(
+            [(item["slug"], item["count"]) for item in facets["categories"]],
+            [("phones", 3), ("electronics", 1)],
+        )
+        self.assertEqual(
+            facets["price"],
+            [
+                {"min": None, "max": 25, "count": 1},
+                {"min": 25, "max": 50, "count": 2},
+                {"min": 500, "max": 1000, "count": 1},
+            ],
+        )
+        self.assertEqual(
+            facets["attributes"],
+            {
+                "color": [
+                    {"value": "black", "count": 3},
+                    {"value": "white", "count": 1},
+                ]
+            },
+        )
+
+        response = self.client.get(
+            self.url, {"max_price": 40, "attributes": '{"color": "black"}'}
+        )
+        facets = response.data["data"]
+        self.assertEqual(
+            [(item["slug"], item["count"]) for item in facets["categories"]],
+            [("phones", 1)],
+        )
+        self.assertEqual(
+            facets["price"], [{"min": None, "max": 25, "count": 1}]
+        )
+
+    def test_cached_until_the_catalog_changes(self):
+        params = {"category": self.phones.id, "page": 3}
+        self.client.get(self.url, params)
+        # Parameters that do not filter share the entry
+        with self.assertNumQueries(0):
+            response = self.client.get(self.url, {"category": self.phones.id})
+        self.assertEqual(response.data["data"]["categories"][0]["count"], 3)
+
+        key = make_versioned_key(CATALOG_CACHE, "facets")
+        product = Product.objects.get(title="Phone D")
+        product.in_stock = True
+        with self.captureOnCommitCallbacks(execute=True):
+            product.save()
+        self.assertNotEqual(make_versioned_key(CATALOG_CACHE, "facets"), key)
+
+        response = self.client.get(self.url, {"category": self.phones.id})
+        self.assertEqual(response.data["data"]["categories"][0]["count"], 4)
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class AttributeFilterTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name="Shirts", slug="shirts")
+        for title, attributes in [
+            ("Tee", {"sizes": ["M", "L"], "color": "black"}),
+            ("Polo", {"sizes": ["S", "M"], "color": "white"}),
+            ("Vest", {"sizes": ["XL"], "size": {"chest": 110, "fit": "slim"}}),
+        ]:
+            Product.objects.create(
+                title=title,
+                description=title,
+                price="1.00",
+                category=category,
+                attributes=attributes,
+            )
+
+    def setUp(self):
+        cache.clear()
+
+    def titles(self, attributes):
+        response = self.client.get(
+            reverse("product_list"),
+            {"attributes": json.dumps(attributes), "sort": "price"},
+        )
+        return [product["title"] for product in response.data["data"]]
+
+    def test_lists_match_by_containment(self):
+        self.assertEqual(self.titles({"sizes": ["M"]}), ["Tee", "Polo"])
+        self.assertEqual(self.titles({"sizes": ["L", "M"]}), ["Tee"])
+        self.assertEqual(self.titles({"sizes": "M"}), ["Tee", "Polo"])
+        self.assertEqual(
+            self.titles({"sizes": ["M"], "color": "white"}), ["Polo"]
+        )
+        self.assertEqual(self.titles({"sizes": ["M", "XL"]}), [])
+        self.assertEqual(
+            self.titles({"size": {"chest": 110, "fit": "slim"}}), ["Vest"]
+        )
+
+    def test_rows_follow_list_elements(self):
+        product = Product.objects.get(title="Tee")
+        self.assertEqual(
+            sorted(product.attribute_values.values_list("key", "value")),
+            [("color", '"black"'), ("sizes", '"L"'), ("sizes", '"M"')],
+        )
+        product.attributes = {"sizes": ["S", "S"]}
+        product.save()
+        self.assertEqual(
+            list(product.attribute_values.values_list("key", "value")),
+            [("sizes", '"S"')],
+        )
+
+        response = self.client.get(reverse("product_facets"))
+        self.assertEqual(
+            response.data["data"]["attributes"]["sizes"],
+            [
+                {"value": "S", "count": 2},
+                {"value": "M", "count": 1},
+                {"value": "XL", "count": 1},
+            ],
+        )
+
+
+@override_settings(CACHES=LOCMEM_CACHES, PRODUCT_BATCH_MAX_SIZE=5)
+class ProductBatchTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name="Phones", slug="phones")
+        cls.products = [
+            Product.objects.create(
+                title=f"Phone {index}",
+                description="Phone",
+                price="1.00",
+                category=category,
+                in_stock=index != 2,
+            )
+            for index in range(4)
+        ]
+
+    def setUp(self):
+        cache.clear()
+
+    def get(self, ids):
+        return self.client.get(reverse("product_batch"), {"ids": ids})
+
+    def test_requested_order_without_duplicates(self):
+        first, second, out_of_stock, last = [
+            product.id for product in self.products
+        ]
+        missing = last + 100
+        # One query for the products and their categories
+        with self.assertNumQueries(1):
+            response = self.get(
+                f"{last}, {first},{out_of_stock},{missing},{last},{second},"
+            )
+        self.assertEqual(
+            [product["title"] for product in response.data["data"]],
+            ["Phone 3", "Phone 0", "Phone 1"],
+        )
+        self.assertEqual(
+            response.data["data"][0]["category"]["name"], "Phones"
+        )
+
+    def test_invalid_ids(self):
+        ids = ",".join(str(index) for index in range(1, 7))
+        for value in ["", "1,two", "1.5", " , ", ids]:
+            with self.subTest(ids=value):
+                response = self.get(value)
+                self.assertEqual(response.status_code, 400)
+                self.assertIn("ids", response.data["error"]["details"])
+        # Duplicates count once towards the limit
+        self.assertEqual(self.get("1,1,2,2,3,3,4,4,5,5").status_code, 200)
+
+
+class ProductExportTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name="Phones", slug="phones")
+        Product.objects.bulk_create(
+            [
+                Product(
+                    title=f"Phone {index}",
+                    description="A phone, with a comma",
+                    price=f"{index}99.00",
+                    category=category,
+                    attributes={"color": "black"},
+                    in_stock=index != 3,
+                )
+                for index in range(5)
+            ]
+        )
+        cls.staff = User.objects.create(phone="+998900000001", is_staff=True)
+        cls.partner = User.objects.create(phone="+998900000002")
+        cls.partner.user_permissions.add(
+            Permission.objects.get(codename="export_product")
+        )
+        cls.customer = User.objects.create(phone="+998900000003")
+
+    def setUp(self):
+        self.client = APIClient()
+        self.url = reverse("product_export")
+
+    def test_ndjson_export(self):
+        self.client.force_authenticate(self.staff)
+        # One query, rows are fetched in chunks while streaming
+        with self.assertNumQueries(1):
+            response = self.client.get(self.url)
+            lines = b"".join(response.streaming_content).splitlines()
+
+        self.assertEqual(response["Content-Type"], "application/x-ndjson")
+        records = [json.loads(line) for line in lines]
+        self.assertEqual(
+            [record["title"] for record in records],
+            ["Phone 0", "Phone 1", "Phone 2", "Phone 4"],
+        )
+        self.assertEqual(records[0]["category"], "phones")
+        self.assertEqual(records[0]["price"], "99.00")
+        self.assertEqual(records[0]["attributes"], {"color": "black"})
+
+    def test_csv_export(self):
+        self.client.force_authenticate(self.partner)
+        response = self.client.get(self.url, {"format": "csv"})
+        content = b"".join(response.streaming_content).decode()
+
+        self.assertEqual(response["Content-Type"], "text/csv; charset=utf-8")
+        rows = list(csv.DictReader(io.StringIO(content)))
+        self.assertEqual(len(rows), 4)
+        self.assertEqual(rows[0]["description"], "A phone, with a comma")
+        self.assertEqual(rows[0]["attributes"], '{"color":"black"}')
+
+    def test_export_requires_permission(self):
+        self.assertEqual(self.client.get(self.url).status_code, 401)
+
+        self.client.force_authenticate(self.customer)
+        self.assertEqual(self.client.get(self.url).status_code, 403)
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class ImportProductsTests(TestCase):
+    def import_file(self, suffix, content):
+        with tempfile.NamedTemporaryFile(
+            "w", suffix=suffix, delete=False
+        ) as file:
+            file.write(content)
+        self.addCleanup(os.remove, file.name)
+        call_command("import_products", file.name, stdout=io.StringIO())
+
+    def test_csv_import_creates_catalog(self):
+        self.import_file(
+            ".csv",
+            "sku,title,description,price,category,category_name,attributes\n"
+            "A-1,Phone,Smartphone,499.00,phones,Phones,"
+            '"{""color"": ""red""}"\n'
+            "A-2,Laptop,Notebook,999.50,laptops,,\n",
+        )
+
+        phone = Product.objects.get(sku="A-1")
+        self.assertEqual(phone.category.name, "Phones")
+        self.assertEqual(str(phone.price), "499.00")
+        self.assertEqual(
+            list(phone.attribute_values.values_list("key", "value")),
+            [("color", '"red"')],
+        )
+        self.assertEqual(
+            Product.objects.get(sku="A-2").category.name, "laptops"
+        )
+        found = get_search_backend().search(
+            Product.objects.all(), "smartphone"
+        )
+        self.assertEqual(list(found), [phone])
+
+    def test_jsonl_import_updates_existing_products(self):
+        category = Category.objects.create(name="Phones", slug="phones")
+        product = Product.objects.create(
+            sku="A-1",
+            title="Old phone",
+            description="Old",
+            price="1.00",
+            category=category,
+            attributes={"color": "red"},
+        )
+        Product.objects.filter(pk=product.pk).update(likes_count=7)
+
+        self.import_file(
+            ".jsonl",
+            '{"sku": "A-1", "title": "Phone", "price": "2.00", '
+            '"category": "phones", "attributes": {"color": "blue"}}\n'
+            '{"sku": "A-1", "title": "New phone", "price": "3.00", '
+            '"category": "phones", "in_stock": false}\n',
+        )
+
+        product.refresh_from_db()
+        self.assertEqual(Product.objects.count(), 1)
+        self.assertEqual(product.title, "New phone")
+        self.assertFalse(product.in_stock)
+        self.assertEqual(product.likes_count, 7)
+        self.assertFalse(product.attribute_values.exists())
+        self.assertEqual(Category.objects.get().name, "Phones")
+        self.assertEqual(Category.objects.get().in_stock_count, 0)
+
+    def test_replaced_thumbnails_get_new_variants(self):
+        category = Category.objects.create(name="Phones", slug="phones")
+        variants = {
+            "source": "products/a.jpg",
+            "small": {"webp": "products/a.small.webp"},
+        }
+        kept, replaced = [
+            Product.objects.create(
+                sku=sku,
+                title="Phone",
+                description="Phone",
+                price="1.00",
+                category=category,
+                thumbnail="products/a.jpg",
+                thumbnail_variants=variants,
+            )
+            for sku in ["A-1", "A-2"]
+        ]
+
+        module = "apps.products.management.commands.import_products"
+        with (
+            mock.patch(f"{module}.generate_thumbnail_variants") as task,
+            mock.patch(f"{module}.delete_variants") as delete,
+            self.captureOnCommitCallbacks(execute=True),
+        ):
+            self.import_file(
+                ".jsonl",
+                "".join(
+                    json.dumps(
+                        {
+                            "sku": sku,
+                            "title": "Phone",
+                            "price": "1.00",
+                            "category": "phones",
+                            "thumbnail": thumbnail,
+                        }
+                    )
+                    + "\n"
+                    for sku, thumbnail in [
+                        ("A-1", "products/a.jpg"),
+                        ("A-2", "products/b.jpg"),
+                        ("A-3", "products/c.jpg"),
+                        ("A-4", ""),
+                    ]
+                ),
+            )
+
+        kept.refresh_from_db()
+        replaced.refresh_from_db()
+        self.assertEqual(kept.thumbnail_variants, variants)
+        self.assertEqual(replaced.thumbnail.name, "products/b.jpg")
+        self.assertEqual(replaced.thumbnail_variants, {})
+        delete.assert_called_once_with(variants, mock.ANY)
+        self.assertCountEqual(
+            [call.args for call in task.delay.call_args_list],
+            [(replaced.pk,), (Product.objects.get(sku="A-3").pk,)],
+        )
+
+    def test_invalid_row_reports_line(self):
+        with self.assertRaisesMessage(CommandError, ":2: missing 'price'"):
+            self.import_file(
+                ".jsonl",
+                '{"sku": "A-1", "title": "Phone", "price": "2.00", '
+                '"category": "phones"}\n'
+                '{"sku": "A-2", "title": "Phone", "category": "phones"}\n',
+            )
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class CategoryTreeTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.electronics = Category.objects.create(
+            name="Electronics", slug="electronics"
+        )
+        self.phones = Category.objects.create(
+            name="Phones", slug="phones", parent=self.electronics
+        )
+        self.android = Category.objects.create(
+            name="Android", slug="android", parent=self.phones
+        )
+        self.books = Category.objects.create(name="Books", slug="books")
+
+    def create_product(self, category, **kwargs):
+        return Product.objects.create(
+            title="Product",
+            description="Product",
+            price="1.00",
+            category=category,
+            **kwargs,
+        )
+
+    def counts(self):
+        return dict(Category.objects.values_list("slug", "in_stock_count"))
+
+    def test_paths(self):
+        self.assertEqual(self.electronics.path, f"{self.electronics.id}/")
+        self.assertEqual(
+            Category.objects.get(pk=self.android.pk).path,
+            f"{self.electronics.id}/{self.phones.id}/{self.android.id}/",
+        )
+
+    def test_subtree_filter(self):
+        phone = self.create_product(self.phones)
+        android = self.create_product(self.android)
+        self.create_product(self.books)
+
+        response = APIClient().get(
+            reverse("product_list"), {"category": self.electronics.id}
+        )
+        self.assertEqual(
+            {product["id"] for product in response.data["data"]},
+            {phone.id, android.id},
+        )
+        response = APIClient().get(reverse("product_list"), {"category": 0})
+        self.assertEqual(response.data["data"], [])
+
+    def test_counts_follow_product_changes(self):
+        product = self.create_product(self.android)
+        self.create_product(self.books, in_stock=False)
+        self.assertEqual(
+            self.counts(),
+            {"electronics": 1, "phones": 1, "android": 1, "books": 0},
+        )
+
+        product.category = self.books
+        product.save()
+        self.assertEqual(
+            self.counts(),
+            {"electronics": 0, "phones": 0, "android": 0, "books": 1},
+        )
+
+        product.in_stock = False
+        product.save(update_fields=["in_stock"])
+        self.assertEqual(self.counts()["books"], 0)
+
+        product.in_stock = True
+        product.save()
+        product.delete()
+        self.assertEqual(self.counts()["books"], 0)
+
+    def test_move_rewrites_subtree(self):
+        self.create_product(self.android)
+        self.phones.parent = self.books
+        self.phones.save()
+
+        self.assertEqual(
+            Category.objects.get(pk=self.android.pk).path,
+            f"{self.books.id}/{self.phones.id}/{self.android.id}/",
+        )
+        self.assertEqual(
+            self.counts(),
+            {"electronics": 0, "phones": 1, "android": 1, "books": 1},
+        )
+        self.assertEqual(Category.objects.refresh_product_counts(), 0)
+
+        self.books.parent = self.android
+        with self.assertRaises(ValueError):
+            self.books.save()
+
+    def test_category_tree_is_cached(self):
+        self.create_product(self.android)
+        url = reverse("category_list")
+        with self.assertNumQueries(1):
+            response = APIClient().get(url)
+        with self.assertNumQueries(0):
+            APIClient().get(url)
+
+        books, electronics = response.data["data"]
+        self.assertEqual(
+            [books["slug"], electronics["slug"]], ["books", "electronics"]
+        )
+        self.assertEqual(electronics["product_count"], 1)
+        self.assertEqual(
+            electronics["children"][0]["children"][0],
+            {
+                "id": self.android.id,
+                "name": "Android",
+                "slug": "android",
+                "product_count": 1,
+                "children": [],
+            },
+        )
+
+
+@override_settings(CACHES=LOCMEM_CACHES, PRODUCT_SUGGEST_REFRESH_INTERVAL=0)
+class ProductSuggestTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        # Start every test without a built index
+        self.enterContext(
+            mock.patch.dict(
+                "apps.products.suggest._state",
+                index=None,
+                generation=None,
+                checked_at=None,
+            )
+        )
+        self.phones = Category.objects.create(name="Phones", slug="phones")
+        for title, likes, in_stock in [
+            ("Phone case", 1, True),
+            ("Phone X", 5, True),
+            ("Phone Old", 50, False),
+            ("iPhone", 9, True),
+            ("Laptop", 0, True),
+        ]:
+            product = Product.objects.create(
+                title=title,
+                description=title,
+                price="1.00",
+                category=self.phones,
+                in_stock=in_stock,
+            )
+            Product.objects.filter(pk=product.pk).update(likes_count=likes)
+        self.url = reverse("product_suggest")
+
+    def texts(self, suggestions):
+        return [suggestion["text"] for suggestion in suggestions]
+
+    def test_prefix_suggestions_ranked_by_popularity(self):
+        index = SuggestionIndex.build()
+        # Phones holds 4 in-stock products
+        expected = ["Phone X", "Phones", "Phone case"]
+        self.assertEqual(self.texts(index.suggest("ph")), expected)
+        self.assertEqual(self.texts(index.suggest("  PHONE ")), expected)
+        self.assertEqual(self.texts(index.suggest("phone c")), ["Phone case"])
+        self.assertEqual(self.texts(index.suggest("ph", limit=1)), ["Phone X"])
+        self.assertEqual(index.suggest("phonograph"), [])
+        self.assertEqual(index.suggest("xy"), [])
+        self.assertEqual(index.suggest(""), [])
+        self.assertEqual(
+            index.suggest("iph")[0],
+            {"type": "product", "id": mock.ANY, "text": "iPhone"},
+        )
+
+        # Precomputed answers match the ranked scans
+        with mock.patch("apps.products.suggest.SCAN_LIMIT", 1):
+            precomputed = SuggestionIndex.build()
+        self.assertIn("phone", precomputed.top)
+        for query in ["p", "ph", "phone", "phone c", "i", "lap"]:
+            self.assertEqual(precomputed.suggest(query), index.suggest(query))
+
+    def test_endpoint_serves_published_snapshots(self):
+        # Requests never build the index, the first one queues a build
+        with (
+            mock.patch(
+                "apps.products.tasks.refresh_suggestion_index.delay"
+            ) as delay,
+            self.assertNumQueries(0),
+        ):
+            response = self.client.get(self.url, {"q": "lap"})
+            self.client.get(self.url, {"q": "lap"})
+        self.assertEqual(response.data["data"], [])
+        delay.assert_called_once_with()
+
+        self.assertTrue(publish_suggestion_index())
+        self.assertFalse(publish_suggestion_index())
+        # Loaded beside the request, which still answers from the old
+        # index; inline here
+        self.enterContext(
+            mock.patch(
+                "apps.products.suggest._load_in_background",
+                load_suggestion_index,
+            )
+        )
+        with self.assertNumQueries(0):
+            response = self.client.get(self.url, {"q": "lap"})
+            self.assertEqual(response.data["data"], [])
+            response = self.client.get(self.url, {"q": "lap"})
+        self.assertEqual(self.texts(response.data["data"]), ["Laptop"])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Product.objects.create(
+                title="Lapdesk",
+                description="Desk",
+                price="1.00",
+                category=self.phones,
+            )
+        self.assertTrue(publish_suggestion_index())
+        self.client.get(self.url, {"q": "lap"})
+        response = self.client.get(self.url, {"q": "lap"})
+        self.assertEqual(
+            self.texts(response.data["data"]), ["Lapdesk", "Laptop"]
+        )
+
+    def test_snapshot_loads_in_background(self):
+        publish_suggestion_index()
+        self.assertEqual(len(get_suggestion_index()), 0)
+        for _ in range(100):
+            if not suggest._loading.is_set():
+                break
+            time.sleep(0.01)
+        self.assertEqual(
+            self.texts(get_suggestion_index().suggest("iph")), ["iPhone"]
+        )
+
+    def test_invalid_limit(self):
+        response = self.client.get(self.url, {"q": "ph", "limit": 100})
+        self.assertEqual(response.status_code, 400)
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class ProductRelationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name="Phones", slug="phones")
+        cls.phone, cls.case, cls.charger, cls.cable = [
+            Product.objects.create(
+                title=title,
+                description=title,
+                price="1.00",
+                category=category,
+            )
+            for title in ["Phone", "Case", "Charger", "Cable"]
+        ]
+        user = User.objects.create(phone="+998900000001")
+        baskets = [
+            ("delivered", [cls.phone, cls.case, cls.charger]),
+            ("delivered", [cls.phone, cls.charger]),
+            ("pending", [cls.phone, cls.charger, cls.cable]),
+            ("cancelled", [cls.phone, cls.case, cls.cable]),
+            ("cancelled", [cls.phone, cls.cable]),
+        ]
+        # Order.save sends notifications, bulk_create skips it
+        orders = Order.objects.bulk_create(
+            [
+                Order(
+                    user=user,
+                    order_number=f"ORD-{index}",
+                    status=status,
+                    shipping_address="Tashkent",
+                    subtotal=1,
+                    total=1,
+                )
+                for index, (status, _) in enumerate(baskets)
+            ]
+        )
+        OrderItem.objects.bulk_create(
+            [
+                OrderItem(order=order, product=product, quantity=1, price=1)
+                for order, (_, products) in zip(orders, baskets)
+                for product in products
+            ]
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def related(self, product):
+        response = self.client.get(
+            reverse("product_related", args=[product.id])
+        )
+        return [item["title"] for item in response.data["data"]]
+
+    def test_rebuild_counts_co_purchases(self):
+        # Phone-charger 3 orders, every other pair 1, ties go by id
+        self.assertEqual(rebuild_product_relations(limit=2), 8)
+        self.assertEqual(
+            list(
+                self.phone.relations.order_by("rank").values_list(
+                    "related__title", "rank", "score"
+                )
+            ),
+            [("Charger", 1, 3), ("Case", 2, 1)],
+        )
+        # Replaced, not appended, on every run
+        self.assertEqual(rebuild_product_relations(limit=2), 8)
+
+    def test_related_endpoint(self):
+        rebuild_product_relations()
+        with self.assertNumQueries(1):
+            self.assertEqual(
+                self.related(self.phone), ["Charger", "Case", "Cable"]
+            )
+        self.assertEqual(self.related(self.cable), ["Phone", "Charger"])
+
+        self.charger.in_stock = False
+        with self.captureOnCommitCallbacks(execute=True):
+            self.charger.save()
+        self.assertEqual(self.related(self.cable), ["Phone"])
+        self.assertEqual(
+            self.client.get(reverse("product_related", args=[0])).status_code,
+            404,
+        )
+
+
+@override_settings(
+    CACHES=LOCMEM_CACHES,
+    PRODUCT_TRENDING_HALF_LIFE_DAYS=1,
+    PRODUCT_TRENDING_WINDOW_DAYS=10,
+    PRODUCT_TRENDING_WEIGHTS={"likes": 1, "orders": 3, "reviews": 2},
+)
+class TrendingTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.electronics = Category.objects.create(
+            name="Electronics", slug="electronics"
+        )
+        phones = Category.objects.create(
+            name="Phones", slug="phones", parent=cls.electronics
+        )
+        books = Category.objects.create(name="Books", slug="books")
+        cls.phone, cls.laptop, cls.book, cls.idle = [
+            Product.objects.create(
+                title=title,
+                description=title,
+                price="1.00",
+                category=category,
+            )
+            for title, category in [
+                ("Phone", phones),
+                ("Laptop", cls.electronics),
+                ("Book", books),
+                ("Idle", books),
+            ]
+        ]
+        users = [
+            User.objects.create(phone=f"+99890000000{index}")
+            for index in range(3)
+        ]
+        now = timezone.now()
+
+        def age(event, days):
+            type(event).objects.filter(pk=event.pk).update(
+                created_at=now - timedelta(days=days, hours=1)
+            )
+
+        # Phone: two likes today, 2.0
+        for user in users[:2]:
+            ProductLike.objects.create(user=user, product=cls.phone)
+        # Laptop: a review today and a like a day ago, 2.0 + 0.5
+        Review.objects.create(user=users[0], product=cls.laptop, rating=5)
+        age(ProductLike.objects.create(user=users[0], product=cls.laptop), 1)
+        # Book: an order two days ago, 3 * 0.25, and old likes
+        order = Order.objects.bulk_create(
+            [
+                Order(
+                    user=users[0],
+                    order_number="ORD-1",
+                    shipping_address="Tashkent",
+                    subtotal=1,
+                    total=1,
+                )
+            ]
+        )[0]
+        age(
+            OrderItem.objects.create(
+                order=order, product=cls.book, quantity=1, price=1
+            ),
+            2,
+        )
+        for user in users[1:]:
+            age(ProductLike.objects.create(user=user, product=cls.book), 10)
+        # Idle: a stale score and nothing recent
+        Product.objects.filter(pk=cls.idle.pk).update(trending_score=9)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_refresh_decays_scores(self):
+        self.assertEqual(Product.objects.refresh_trending_scores(), 4)
+        scores = dict(Product.objects.values_list("title", "trending_score"))
+        self.assertEqual(
+            scores, {"Phone": 2.0, "Laptop": 2.5, "Book": 0.75, "Idle": 0.0}
+        )
+
+    def test_trending_sort_and_category_top(self):
+        Product.objects.refresh_trending_scores()
+        response = self.client.get(
+            reverse("product_list"), {"sort": "trending", "order": "desc"}
+        )
+        self.assertEqual(
+            [product["title"] for product in response.data["data"]],
+            ["Laptop", "Phone", "Book", "Idle"],
+        )
+
+        url = reverse("product_trending")
+        params = {"category": self.electronics.id}
+        response = self.client.get(url, params)
+        self.assertEqual(
+            [product["title"] for product in response.data["data"]],
+            ["Laptop", "Phone"],
+        )
+        with self.assertNumQueries(0):
+            self.client.get(url, params)
+        response = self.client.get(url)
+        self.assertEqual(len(response.data["data"]), 3)
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class LikeStoreTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name="Phones", slug="phones")
+        cls.phone, cls.case = [
+            Product.objects.create(
+                title=title, description=title, price="1.00", category=category
+            )
+            for title in ["Phone", "Case"]
+        ]
+        cls.user, cls.other = [
+            User.objects.create(phone=f"+99890000000{index}")
+            for index in range(2)
+        ]
+
+    def test_like_rows_update_counts(self):
+        likes = [
+            ProductLike.objects.create(user=user, product=self.phone)
+            for user in (self.user, self.other)
+        ]
+        self.phone.refresh_from_db()
+        self.assertEqual(self.phone.likes_count, 2)
+        likes[0].delete()
+        self.phone.refresh_from_db()
+        self.assertEqual(self.phone.likes_count, 1)
+        # A drifted counter never goes below zero
+        Product.objects.filter(pk=self.phone.pk).update(likes_count=0)
+        likes[1].delete()
+        self.phone.refresh_from_db()
+        self.assertEqual(self.phone.likes_count, 0)
+
+    def test_stores_must_implement_toggle_and_liked_ids(self):
+        class ToggleOnlyStore(BaseLikeStore):
+            def toggle(self, user_id, product):
+                return False, 0
+
+        with self.assertRaises(TypeError):
+            ToggleOnlyStore()
+
+    def test_database_store_toggles(self):
+        store = DatabaseLikeStore()
+        self.assertEqual(store.toggle(self.user.id, self.phone), (True, 1))
+        self.assertEqual(store.toggle(self.other.id, self.phone), (True, 2))
+        self.assertEqual(store.liked_ids(self.user.id), {self.phone.id})
+        self.assertEqual(store.toggle(self.user.id, self.phone), (False, 1))
+        self.assertEqual(store.liked_ids(self.user.id), set())
+
+    def test_like_endpoint(self):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        url = reverse("product_like", args=[self.phone.id])
+        response = client.post(url)
+        self.assertEqual(
+            response.data["data"], {"liked": True, "likes_count": 1}
+        )
+        response = client.post(url)
+        self.assertEqual(
+            response.data["data"], {"liked": False, "likes_count": 0}
+        )
+
+    def test_apply_like_states(self):
+        ProductLike.objects.create(user=self.user, product=self.case)
+        apply_like_states(
+            [
+                (self.user.id, self.phone.id, True),
+                (self.other.id, self.phone.id, True),
+                (self.user.id, self.case.id, False),
+                # Already persisted, and a deleted product
+                (self.other.id, self.phone.id, True),
+                (self.user.id, 0, True),
+            ]
+        )
+        self.assertEqual(
+            dict(Product.objects.values_list("title", "likes_count")),
+            {"Phone": 2, "Case": 0},
+        )
+        self.assertEqual(ProductLike.objects.count(), 2)
+
+    def test_apply_like_states_skips_row_signals(self):
+        users = [
+            User.objects.create(phone=f"+99891000000{index}")
+            for index in range(5)
+        ]
+        ProductLike.objects.bulk_create(
+            [ProductLike(user=user, product=self.phone) for user in users]
+        )
+        DatabaseLikeStore().liked_ids(users[0].id)
+        # Existing products and users, the delete and one recount, in a
+        # savepoint; no update of the product per deleted row
+        with self.assertNumQueries(6):
+            apply_like_states(
+                [(user.id, self.phone.id, False) for user in users]
+            )
+        self.assertFalse(ProductLike.objects.exists())
+        self.phone.refresh_from_db()
+        self.assertEqual(self.phone.likes_count, 0)
+        with self.assertNumQueries(1):
+            self.assertEqual(DatabaseLikeStore().liked_ids(users[0].id), set())
+
+    def test_reconcile_repairs_counts(self):
+        ProductLike.objects.create(user=self.user, product=self.phone)
+        Product.objects.filter(pk=self.phone.pk).update(likes_count=7)
+        self.assertEqual(DatabaseLikeStore().reconcile(), 1)
+        self.phone.refresh_from_db()
+        self.assertEqual(self.phone.likes_count, 1)
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class LikedProductsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name="Phones", slug="phones")
+        cls.products = [
+            Product.objects.create(
+                title=f"Phone {index}",
+                description="Phone",
+                price="1.00",
+                category=category,
+                in_stock=index != 3,
+            )
+            for index in range(5)
+        ]
+        cls.user = User.objects.create(phone="+998900000001")
+        for index in (0, 2, 3, 4):
+            ProductLike.objects.create(
+                user=cls.user, product=cls.products[index]
+            )
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def liked_titles(self, data):
+        return {item["title"] for item in data if item["is_liked"]}
+
+    def test_list_is_liked_from_liked_set(self):
+        url = reverse("product_list")
+        # Count, page and the liked set, however many products
+        with self.assertNumQueries(3):
+            response = self.client.get(url)
+        self.assertEqual(
+            self.liked_titles(response.data["data"]),
+            {"Phone 0", "Phone 2", "Phone 4"},
+        )
+        # The liked set is cached
+        with self.assertNumQueries(2):
+            self.client.get(url)
+
+        self.client.post(reverse("product_like", args=[self.products[0].id]))
+        response = self.client.get(url)
+        self.assertEqual(
+            self.liked_titles(response.data["data"]), {"Phone 2", "Phone 4"}
+        )
+
+        response = self.client.get(url, {"fields": "title"})
+        self.assertEqual(response.data["data"][0], {"title": "Phone 0"})
+        response = APIClient().get(url)
+        self.assertEqual(self.liked_titles(response.data["data"]), set())
+
+    def test_liked_endpoint_pages_with_cursor(self):
+        url = reverse("product_liked")
+        titles = []
+        params = {"limit": 2}
+        while True:
+            response = self.client.get(url, params)
+            titles += [item["title"] for item in response.data["data"]]
+            self.assertTrue(
+                all(item["is_liked"] for item in response.data["data"])
+            )
+            cursor = response.data["meta"]["pagination"]["cursors"]["next"]
+            if cursor is None:
+                break
+            params["cursor"] = cursor
+        # Out of stock products are left out
+        self.assertEqual(titles, ["Phone 4", "Phone 2", "Phone 0"])
+
+        self.assertEqual(APIClient().get(url).status_code, 401)
+
+
+class CartQueryTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name="Phones", slug="phones")
+        cls.products = Product.objects.bulk_create(
+            [
+                Product(
+                    title=f"Phone {index}",
+                    description="Phone",
+                    price="2.50",
+                    category=category,
+                )
+                for index in range(50)
+            ]
+        )
+        cls.user = User.objects.create(phone="+998900000001")
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.cart = Cart.objects.create(user=self.user)
+
+    def fill_cart(self, size):
+        CartItem.objects.bulk_create(
+            [
+                CartItem(cart=self.cart, product=product, quantity=2)
+                for product in self.products[:size]
+            ]
+        )
+
+    def test_cart_query_count_is_constant(self):
+        for size in (1, 50):
+            with self.subTest(size=size):
+                self.cart.items.all().delete()
+                self.fill_cart(size)
+                # The cart, then its items with their products
+                with self.assertNumQueries(2):
+                    response = self.client.get(reverse("cart"))
+
+                data = response.data["data"]
+                self.assertEqual(len(data["items"]), size)
+                self.assertEqual(data["items_count"], 2 * size)
+                self.assertEqual(data["total"], Decimal("5.00") * size)
+
+    def test_remove_from_cart_query_count_is_constant(self):
+        for size in (1, 50):
+            with self.subTest(size=size):
+                self.cart.items.all().delete()
+                self.fill_cart(size)
+                url = reverse("remove_from_cart", args=[self.products[0].id])
+                # Cart, item, its deletion, then items with products
+                with self.assertNumQueries(4):
+                    response = self.client.delete(url)
+                self.assertEqual(len(response.data["data"]["items"]), size - 1)
+
+    def test_add_to_cart_is_one_upsert(self):
+        product = self.products[0]
+        payload = {"product_id": product.id, "quantity": 2}
+        for expected in (2, 5):
+            with self.subTest(quantity=expected):
+                # Cart, the upsert, then items with products
+                with self.assertNumQueries(3):
+                    response = self.client.post(reverse("cart"), payload)
+                self.assertEqual(response.status_code, 200)
+                item = self.cart.items.get(product=product)
+                self.assertEqual(item.quantity, expected)
+                payload["quantity"] = 3
+
+    def test_add_to_cart_rejects_unavailable_products(self):
+        Product.objects.filter(pk=self.products[0].pk).update(in_stock=False)
+        for product_id in (self.products[0].id, 0):
+            with self.subTest(product_id=product_id):
+                response = self.client.post(
+                    reverse("cart"), {"product_id": product_id, "quantity": 1}
+                )
+                self.assertEqual(response.status_code, 400)
+                self.assertIn("product_id", response.data["error"]["details"])
+        self.assertFalse(self.cart.items.exists())
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class ConcurrentAddToCartTests(TransactionTestCase):
+    def test_parallel_adds_lose_no_increment(self):
+        if connection.vendor == "sqlite" and connection.is_in_memory_db():
+            self.skipTest(
+                "In-memory SQLite fails concurrent writers, "
+                "set TEST_DATABASE_NAME=test_db.sqlite3"
+            )
+        category = Category.objects.create(name="Phones", slug="phones")
+        product = Product.objects.create(
+            title="Phone", description="Phone", price="2.50", category=category
+        )
+        user = User.objects.create(phone="+998900000001")
+        cart = Cart.objects.create(user=user)
+        workers = 8
+        barrier = threading.Barrier(workers)
+        statuses = []
+
+        def add():
+            client = APIClient()
+            client.force_authenticate(user)
+            barrier.wait()
+            try:
+                response = client.post(
+                    reverse("cart"), {"product_id": product.id, "quantity": 1}
+                )
+                statuses.append(response.status_code)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=add) for _ in range(workers)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(statuses, [200] * workers)
+        self.assertEqual(cart.items.get(product=product).quantity, workers)
+
+
+REDIS_CACHES = {
+    "default": {
+        "BACKEND": "django_redis.cache.RedisCache",
+        "LOCATION": (
+            f"redis://{settings.REDIS_HOST}:{settings.REDIS_PORT}/15"
+        ),
+    }
+}
+
+
+def redis_available():
+    import redis
+
+    try:
+        return redis.Redis(
+            settings.REDIS_HOST, settings.REDIS_PORT, socket_timeout=1
+        ).ping()
+    except redis.RedisError:
+        return False
+
+
+@unittest.skipUnless(redis_available(), "Redis is not running")
+@override_settings(
+    CACHES=REDIS_CACHES,
+    PRODUCT_LIKE_STORE="apps.products.likes.RedisLikeStore",
+)
+class RedisLikeStoreTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name="Phones", slug="phones")
+        cls.phone = Product.objects.create(
+            title="Phone", description="Phone", price="1.00", category=category
+        )
+        cls.users = [
+            User.objects.create(phone=f"+99890000000{index}")
+            for index in range(3)
+        ]
+        ProductLike.objects.create(user=cls.users[0], product=cls.phone)
+        cls.phone.refresh_from_db()
+
+    def setUp(self):
+        self.store = get_like_store()
+        self.assertIsInstance(self.store, RedisLikeStore)
+        self.store.redis.flushdb()
+        self.addCleanup(self.store.redis.flushdb)
+
+    def test_toggles_are_written_behind(self):
+        first, second, third = self.users
+        # Served from Redis, nothing is written yet
+        with self.assertNumQueries(1):
+            self.assertEqual(
+                self.store.toggle(second.id, self.phone), (True, 2)
+            )
+        self.assertEqual(self.store.toggle(third.id, self.phone), (True, 3))
+        self.assertEqual(self.store.toggle(first.id, self.phone), (False, 2))
+        self.assertEqual(self.store.toggle(third.id, self.phone), (False, 1))
+        self.assertEqual(self.store.liked_ids(second.id), {self.phone.id})
+        self.assertEqual(self.store.liked_ids(first.id), set())
+        self.assertEqual(ProductLike.objects.get().user, first)
+
+        self.assertEqual(self.store.flush(), 3)
+        self.assertEqual(ProductLike.objects.get().user, second)
+        self.phone.refresh_from_db()
+        self.assertEqual(self.phone.likes_count, 1)
+        self.assertEqual(self.store.flush(), 0)
+
+    def test_reconcile_reloads_clean_keys(self):
+        self.store.toggle(self.users[1].id, self.phone)
+        self.store.flush()
+        # Drift in both the counter and the database
+        self.store.redis.set(
+            self.store.count_key(self.phone.id), 40, keepttl=True
+        )
+        Product.objects.filter(pk=self.phone.pk).update(likes_count=9)
+
+        self.assertEqual(self.store.reconcile(), 1)
+        self.phone.refresh_from_db()
+        self.assertEqual(self.phone.likes_count, 2)
+        self.assertEqual(
+            self.store.toggle(self.users[2].id, self.phone), (True, 3)
+        )
+
+    def test_detail_serves_unflushed_likes(self):
+        client = APIClient()
+        client.force_authenticate(self.users[1])
+        url = reverse("product_detail", args=[self.phone.id])
+        response = client.get(url)
+        self.assertFalse(response.data["data"]["is_liked"])
+
+        self.store.toggle(self.users[1].id, self.phone)
+        # Not flushed, the stale ETag must not answer 304
+        response = client.get(url, HTTP_IF_NONE_MATCH=response["ETag"])
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.data["data"]["is_liked"])
+        self.assertFalse(
+            ProductLike.objects.filter(user=self.users[1]).exists()
+        )
+
+
+def make_image(size=(1000, 800), image_format="PNG", mode="RGBA"):
+    buffer = io.BytesIO()
+    Image.new(mode, size, "red").save(buffer, image_format)
+    return SimpleUploadedFile(
+        f"upload.{image_format.lower()}", buffer.getvalue()
+    )
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class ImageVariantTests(TestCase):
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        self.enterContext(override_settings(MEDIA_ROOT=media_root))
+        self.category = Category.objects.create(name="Phones", slug="phones")
+
+    def create_product(self):
+        with self.captureOnCommitCallbacks() as callbacks:
+            product = Product.objects.create(
+                title="Phone",
+                description="A phone",
+                price="499.00",
+                category=self.category,
+                thumbnail=make_image(),
+            )
+        # Catalog and typeahead invalidation, and the variant task, which
+        # is run inline below
+        self.assertEqual(len(callbacks), 3)
+        return product
+
+    def test_thumbnail_variants(self):
+        product = self.create_product()
+        self.assertTrue(generate_thumbnail_variants(product.id))
+
+        product.refresh_from_db()
+        variants = product.thumbnail_variants
+        self.assertEqual(variants["source"], product.thumbnail.name)
+        storage = product.thumbnail.storage
+        for variant, max_side in settings.PRODUCT_IMAGE_VARIANTS.items():
+            for image_format in ["webp", "jpeg"]:
+                name = variants[variant][image_format]
+                self.assertEqual(
+                    os.path.dirname(name),
+                    os.path.dirname(product.thumbnail.name),
+                )
+                with Image.open(storage.path(name)) as image:
+                    self.assertEqual(image.format, image_format.upper())
+                    # 1000x800 upload, never enlarged
+                    width = min(max_side, 1000)
+                    self.assertEqual(image.size, (width, width * 4 // 5))
+
+        data = ProductListSerializer(product).data
+        self.assertEqual(
+            data["thumbnail_variants"]["small"]["webp"],
+            storage.url(variants["small"]["webp"]),
+        )
+        # Already up to date
+        self.assertFalse(generate_thumbnail_variants(product.id))
+
+    def test_replaced_image_resets_variants(self):
+        product = self.create_product()
+        generate_thumbnail_variants(product.id)
+        product.refresh_from_db()
+        old_name = product.thumbnail_variants["small"]["jpeg"]
+        storage = product.thumbnail.storage
+
+        with (
+            mock.patch.object(generate_thumbnail_variants, "delay") as delay,
+            self.captureOnCommitCallbacks(execute=True),
+        ):
+            product.thumbnail = make_image((300, 300), "JPEG", "RGB")
+            product.save()
+
+        delay.assert_called_once_with(product.id)
+        product.refresh_from_db()
+        self.assertEqual(product.thumbnail_variants, {})
+        # Content-addressed files may be shared, dedupe_media prunes them
+        self.assertTrue(storage.exists(old_name))
+
+    def test_detail_image_variants(self):
+        product = self.create_product()
+        image = ProductImage.objects.create(
+            product=product, image=make_image()
+        )
+        generate_image_variants(image.id)
+
+        response = APIClient().get(
+            reverse("product_detail", args=[product.id]),
+            {"fields": "images,image_variants"},
+        )
+
+        data = response.json()["data"]
+        self.assertEqual(len(data["image_variants"]), 1)
+        self.assertEqual(
+            set(data["image_variants"][0]),
+            set(settings.PRODUCT_IMAGE_VARIANTS),
+        )
+
+
+class DedupeMediaTests(TestCase):
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        self.enterContext(override_settings(MEDIA_ROOT=media_root))
+        # Files uploaded before the storage was content-addressed
+        legacy = FileSystemStorage(location=media_root)
+        self.photo = legacy.save("products/images/a.png", ContentFile(b"1"))
+        self.copy = legacy.save("products/images/b.png", ContentFile(b"1"))
+        self.orphan = legacy.save("products/images/c.png", ContentFile(b"2"))
+
+        category = Category.objects.create(name="Phones", slug="phones")
+        self.product = Product.objects.create(
+            title="Phone",
+            description="A phone",
+            price="499.00",
+            category=category,
+            thumbnail=self.copy,
+        )
+        self.images = [
+            ProductImage.objects.create(product=self.product, image=name)
+            for name in [self.photo, self.copy]
+        ]
+        ProductImage.objects.filter(pk=self.images[0].pk).update(
+            variants={"source": self.photo}
+        )
+
+    def test_references_point_to_one_copy(self):
+        call_command("dedupe_media", "--prune", stdout=io.StringIO())
+
+        self.product.refresh_from_db()
+        for image in self.images:
+            image.refresh_from_db()
+        names = {self.product.thumbnail.name} | {
+            image.image.name for image in self.images
+        }
+        self.assertEqual(len(names), 1)
+        self.assertEqual(
+            self.images[0].variants, {"source": self.product.thumbnail.name}
+        )
+        self.assertEqual(
+            default_storage.listdir("products/images")[1],
+            [os.path.basename(names.pop())],
+        )
+
+    def test_dry_run_changes_nothing(self):
+        call_command("dedupe_media", "--dry-run", stdout=io.StringIO())
+
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.thumbnail.name, self.copy)
+        self.assertTrue(default_storage.exists(self.orphan))
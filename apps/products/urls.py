@@ -3,8 +3,22 @@ from django.urls import path
 from . import views
 
 urlpatterns = [
+    path("categories/", views.category_list, name="category_list"),
     path("products/", views.product_list, name="product_list"),
+    path("products/batch/", views.product_batch, name="product_batch"),
+    path("products/facets/", views.product_facets, name="product_facets"),
+    path("products/liked/", views.product_liked, name="product_liked"),
+    path("products/suggest/", views.product_suggest, name="product_suggest"),
+    path(
+        "products/trending/", views.product_trending, name="product_trending"
+    ),
+    path("products/export/", views.product_export, name="product_export"),
     path("products/<int:id>/", views.product_detail, name="product_detail"),
+    path(
+        "products/<int:id>/related/",
+        views.product_related,
+        name="product_related",
+    ),
     path("products/<int:id>/like/", views.product_like, name="product_like"),
     path("cart/", views.cart_view, name="cart"),
     path(
@@ -1,69 +1,360 @@
-from django.db.models import Q
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Prefetch, prefetch_related_objects
+from django.http import StreamingHttpResponse
 from django.shortcuts import get_object_or_404
-from rest_framework.decorators import api_view, permission_classes
+from django.utils.cache import patch_vary_headers
+from rest_framework.decorators import (
+    api_view,
+    permission_classes,
+    renderer_classes,
+)
 from rest_framework.permissions import AllowAny, IsAuthenticated
 
-from apps.common.pagination import CustomPageNumberPagination
+from apps.common.cache import cache_anonymous_response, make_versioned_key
+from apps.common.conditional import (
+    conditional_response,
+    make_etag,
+    set_validators,
+)
+from apps.common.pagination import CustomCursorPagination, get_paginator
+from apps.common.renderers import CSVRenderer, NDJSONRenderer
 from apps.common.responses import APIResponse
 
+from .facets import compute_facets
 from .filters import ProductFilter
-from .models import Cart, CartItem, Product, ProductLike
+from .likes import get_like_store, mark_liked
+from .models import (
+    CATALOG_CACHE,
+    Cart,
+    CartItem,
+    Category,
+    Product,
+    liked_by,
+)
+from .permissions import CanExportCatalog
+from .search import get_search_backend
 from .serializers import (
     AddToCartSerializer,
     CartSerializer,
     ProductDetailSerializer,
     ProductListSerializer,
+    product_export_values,
+    product_list_values,
 )
+from .suggest import get_suggestion_index
+
+# Public sort names, each backed by an index on in-stock products
+SORT_FIELDS = {
+    "created_at": "created_at",
+    "price": "price",
+    "rating": "average_rating",
+    "popularity": "likes_count",
+    "trending": "trending_score",
+}
+
+# Query parameters that change the facet counts
+FACET_PARAMS = {*ProductFilter.base_filters, "search"}
 
 
 @api_view(["GET"])
 @permission_classes([AllowAny])
+@cache_anonymous_response(CATALOG_CACHE, settings.CATALOG_CACHE_TIMEOUT)
 def product_list(request):
     """List products with filtering and pagination"""
-    queryset = Product.objects.filter(in_stock=True).select_related("category")
+    fields = ProductListSerializer.selected_fields(request)
+    queryset = Product.objects.filter(in_stock=True)
 
     # Apply filters
     product_filter = ProductFilter(request.GET, queryset=queryset)
     queryset = product_filter.qs
 
-    # Apply search
+    # Apply search, results are ranked by relevance unless sorted
     search = request.GET.get("search")
+    sort_fields = SORT_FIELDS
     if search:
-        queryset = queryset.filter(
-            Q(title__icontains=search) | Q(description__icontains=search)
-        )
+        queryset = get_search_backend().search(queryset, search)
+        sort_fields = {"relevance": "search_rank", **SORT_FIELDS}
 
-    # Apply ordering
-    sort_field = request.GET.get("sort", "created_at")
-    order = request.GET.get("order", "asc")
+    # Apply ordering, "id" keeps pages stable when sort values tie
+    sort = request.GET.get("sort", "relevance" if search else "created_at")
+    if sort not in sort_fields:
+        return APIResponse.error(
+            "Invalid request",
+            details={"sort": [f"Must be one of: {', '.join(sort_fields)}"]},
+        )
+    sort_field = sort_fields[sort]
+    order = request.GET.get("order", "desc" if sort == "relevance" else "asc")
 
-    if sort_field == "rating":
-        # Custom ordering by average rating would require annotation
-        pass
+    if order == "desc":
+        ordering = (f"-{sort_field}", "-id")
     else:
-        if order == "desc":
-            sort_field = f"-{sort_field}"
-        queryset = queryset.order_by(sort_field)
+        ordering = (sort_field, "id")
+    queryset = queryset.order_by(*ordering)
+
+    # Rows come from values(), the paginator reads the ordering columns
+    queryset = product_list_values.values(
+        queryset, fields, extra=[field.lstrip("-") for field in ordering]
+    )
 
     # Paginate
-    paginator = CustomPageNumberPagination()
+    paginator = get_paginator(request, ordering)
     page = paginator.paginate_queryset(queryset, request)
+    rows = page if page is not None else list(queryset)
+    if "is_liked" in fields:
+        # One liked set lookup instead of a like query per product
+        mark_liked(rows, request.user)
+    data = product_list_values.serialize(rows, fields)
 
     if page is not None:
-        serializer = ProductListSerializer(page, many=True)
-        return paginator.get_paginated_response(serializer.data)
+        return paginator.get_paginated_response(data)
+    return APIResponse.success(data)
+
+
+@api_view(["GET"])
+@permission_classes([IsAuthenticated])
+def product_liked(request):
+    """Products liked by the current user, newest products first"""
+    fields = ProductListSerializer.selected_fields(request)
+    liked = get_like_store().liked_ids(request.user.id)
+    queryset = Product.objects.filter(in_stock=True, id__in=liked)
+    queryset = product_list_values.values(queryset, fields, extra=["id"])
+
+    paginator = CustomCursorPagination(["-id"])
+    rows = paginator.paginate_queryset(queryset, request)
+    for row in rows:
+        row["is_liked"] = True
+    return paginator.get_paginated_response(
+        product_list_values.serialize(rows, fields)
+    )
+
+
+@api_view(["GET"])
+@permission_classes([AllowAny])
+@cache_anonymous_response(CATALOG_CACHE, settings.CATALOG_CACHE_TIMEOUT)
+def product_batch(request):
+    """Get several products by id, in the order they were requested"""
+    try:
+        ids = [
+            int(value)
+            for value in request.GET.get("ids", "").split(",")
+            if value.strip()
+        ]
+    except ValueError:
+        return APIResponse.error(
+            "Invalid request",
+            details={"ids": ["Must be a comma separated list of integers"]},
+        )
+
+    ids = list(dict.fromkeys(ids))
+    max_size = settings.PRODUCT_BATCH_MAX_SIZE
+    if not ids or len(ids) > max_size:
+        return APIResponse.error(
+            "Invalid request",
+            details={"ids": [f"Provide between 1 and {max_size} ids"]},
+        )
 
-    serializer = ProductListSerializer(queryset, many=True)
+    fields = ProductListSerializer.selected_fields(request)
+    queryset = Product.objects.filter(in_stock=True)
+    if "category" in fields:
+        queryset = queryset.select_related("category")
+    products = queryset.in_bulk(ids)
+    if "is_liked" in fields:
+        mark_liked(products.values(), request.user)
+    serializer = ProductListSerializer(
+        [products[id] for id in ids if id in products],
+        many=True,
+        fields=fields,
+    )
     return APIResponse.success(serializer.data)
 
 
 @api_view(["GET"])
 @permission_classes([AllowAny])
+def product_facets(request):
+    """Category, price and attribute counts for a product filter set"""
+    params = request.GET.copy()
+    for param in set(params) - FACET_PARAMS:
+        del params[param]
+
+    cache_key = make_versioned_key(CATALOG_CACHE, "facets", params)
+    facets = cache.get(cache_key)
+    if facets is None:
+        queryset = Product.objects.filter(in_stock=True)
+        queryset = ProductFilter(params, queryset=queryset).qs
+        search = params.get("search")
+        if search:
+            queryset = get_search_backend().search(queryset, search)
+        facets = compute_facets(queryset)
+        cache.set(
+            cache_key, facets, timeout=settings.PRODUCT_FACETS_CACHE_TIMEOUT
+        )
+    return APIResponse.success(facets)
+
+
+@api_view(["GET"])
+@permission_classes([AllowAny])
+def product_suggest(request):
+    """Typeahead suggestions of product titles and category names"""
+    max_limit = settings.PRODUCT_SUGGEST_LIMIT
+    try:
+        limit = int(request.GET.get("limit", max_limit))
+    except ValueError:
+        limit = 0
+    if not 1 <= limit <= max_limit:
+        return APIResponse.error(
+            "Invalid request",
+            details={"limit": [f"Must be between 1 and {max_limit}"]},
+        )
+    query = request.GET.get("q", "")
+    return APIResponse.success(get_suggestion_index().suggest(query, limit))
+
+
+@api_view(["GET"])
+@permission_classes([AllowAny])
+def category_list(request):
+    """The category tree with in-stock product counts per subtree"""
+    cache_key = make_versioned_key(CATALOG_CACHE, "categories")
+    tree = cache.get(cache_key)
+    if tree is None:
+        tree = build_category_tree()
+        cache.set(cache_key, tree, timeout=settings.CATALOG_CACHE_TIMEOUT)
+    return APIResponse.success(tree)
+
+
+def build_category_tree():
+    """Nested category nodes, siblings sorted by name, from one query"""
+    nodes = {}
+    roots = []
+    # Parents come before their children in path order
+    categories = Category.objects.order_by("path").values_list(
+        "id", "parent_id", "name", "slug", "in_stock_count"
+    )
+    for id, parent_id, name, slug, count in categories:
+        node = nodes[id] = {
+            "id": id,
+            "name": name,
+            "slug": slug,
+            "product_count": count,
+            "children": [],
+        }
+        parent = nodes.get(parent_id)
+        (parent["children"] if parent else roots).append(node)
+
+    for node in [*nodes.values(), {"children": roots}]:
+        node["children"].sort(key=lambda child: child["name"])
+    return roots
+
+
+@api_view(["GET"])
+@permission_classes([AllowAny])
+def product_trending(request):
+    """Top trending in-stock products, optionally within a category"""
+    params = request.GET.copy()
+    for param in set(params) - {"category"}:
+        del params[param]
+
+    cache_key = make_versioned_key(CATALOG_CACHE, "trending", params)
+    data = cache.get(cache_key)
+    if data is None:
+        queryset = Product.objects.filter(in_stock=True, trending_score__gt=0)
+        queryset = ProductFilter(params, queryset=queryset).qs
+        queryset = queryset.order_by("-trending_score", "-id")
+        rows = product_list_values.values(queryset)
+        data = product_list_values.serialize(
+            rows[: settings.PRODUCT_TRENDING_LIMIT]
+        )
+        cache.set(cache_key, data, timeout=settings.CATALOG_CACHE_TIMEOUT)
+    # Shared by all users, is_liked is personal
+    mark_liked(data, request.user)
+    return APIResponse.success(data)
+
+
+@api_view(["GET"])
+@permission_classes([CanExportCatalog])
+@renderer_classes([NDJSONRenderer, CSVRenderer])
+def product_export(request):
+    """Stream every in-stock product as NDJSON (default) or CSV"""
+    rows = (
+        product_export_values.values(
+            Product.objects.filter(in_stock=True).order_by("id")
+        )
+        # Server-side cursor on PostgreSQL, memory stays flat
+        .iterator(chunk_size=settings.PRODUCT_EXPORT_CHUNK_SIZE)
+    )
+    renderer = request.accepted_renderer
+    content_type = renderer.media_type
+    if renderer.charset:
+        content_type = f"{content_type}; charset={renderer.charset}"
+    response = StreamingHttpResponse(
+        renderer.stream(product_export_values.stream(rows)),
+        content_type=content_type,
+    )
+    response["Content-Disposition"] = (
+        f'attachment; filename="catalog.{renderer.format}"'
+    )
+    return response
+
+
+@api_view(["GET"])
+@permission_classes([AllowAny])
+@cache_anonymous_response(CATALOG_CACHE, settings.CATALOG_CACHE_TIMEOUT)
 def product_detail(request, id):
     """Get product details"""
-    product = get_object_or_404(Product, id=id, in_stock=True)
-    serializer = ProductDetailSerializer(product, context={"request": request})
-    return APIResponse.success(serializer.data)
+    fields = ProductDetailSerializer.selected_fields(request)
+    queryset = Product.objects.filter(in_stock=True)
+    if "category" in fields:
+        queryset = queryset.select_related("category")
+    writes_behind = get_like_store().writes_behind
+    if "is_liked" in fields and not writes_behind:
+        # The rows are authoritative, answered inside the product query
+        queryset = queryset.annotate(is_liked=liked_by(request.user))
+    product = get_object_or_404(queryset, id=id)
+    if "is_liked" in fields and writes_behind:
+        # The rows trail the store until its next flush
+        mark_liked([product], request.user)
+
+    # Likes, reviews and image changes all touch Product.updated_at
+    timestamps = [product.updated_at]
+    if "category" in fields:
+        timestamps.append(product.category.updated_at)
+    etag = make_etag(
+        product.id,
+        ",".join(fields),
+        getattr(product, "is_liked", None),
+        *timestamps,
+    )
+    last_modified = max(timestamps)
+    not_modified = conditional_response(request, etag, last_modified)
+    if not_modified is not None:
+        return not_modified
+
+    if {"images", "image_variants"} & set(fields):
+        prefetch_related_objects([product], "images")
+    serializer = ProductDetailSerializer(
+        product, fields=fields, context={"request": request}
+    )
+    response = APIResponse.success(serializer.data)
+    patch_vary_headers(response, ["Authorization"])
+    return set_validators(response, etag, last_modified)
+
+
+@api_view(["GET"])
+@permission_classes([AllowAny])
+@cache_anonymous_response(CATALOG_CACHE, settings.CATALOG_CACHE_TIMEOUT)
+def product_related(request, id):
+    """Products frequently bought together with a product, best first"""
+    fields = ProductListSerializer.selected_fields(request)
+    # One lookup on the (product, rank) index joined to the products
+    queryset = Product.objects.filter(
+        bought_with__product_id=id, in_stock=True
+    ).order_by("bought_with__rank")
+    rows = list(product_list_values.values(queryset, fields, extra=["id"]))
+    if not rows:
+        get_object_or_404(Product, id=id)
+    if "is_liked" in fields:
+        mark_liked(rows, request.user)
+    return APIResponse.success(product_list_values.serialize(rows, fields))
 
 
 @api_view(["POST"])
@@ -71,20 +362,8 @@ def product_detail(request, id):
 def product_like(request, id):
     """Toggle like status for a product"""
     product = get_object_or_404(Product, id=id)
-
-    like, created = ProductLike.objects.get_or_create(
-        user=request.user, product=product
-    )
-
-    if not created:
-        like.delete()
-        liked = False
-    else:
-        liked = True
-
-    return APIResponse.success(
-        {"liked": liked, "likes_count": product.likes_count}
-    )
+    liked, likes_count = get_like_store().toggle(request.user.id, product)
+    return APIResponse.success({"liked": liked, "likes_count": likes_count})
 
 
 @api_view(["GET", "POST"])
@@ -94,8 +373,7 @@ def cart_view(request):
     cart, created = Cart.objects.get_or_create(user=request.user)
 
     if request.method == "GET":
-        serializer = CartSerializer(cart)
-        return APIResponse.success(serializer.data)
+        return APIResponse.success(serialize_cart(cart))
 
     elif request.method == "POST":
         serializer = AddToCartSerializer(data=request.data)
@@ -103,17 +381,16 @@ def cart_view(request):
             product_id = serializer.validated_data["product_id"]
             quantity = serializer.validated_data["quantity"]
 
-            product = Product.objects.get(id=product_id)
-            cart_item, created = CartItem.objects.get_or_create(
-                cart=cart, product=product, defaults={"quantity": quantity}
-            )
-
-            if not created:
-                cart_item.quantity += quantity
-                cart_item.save()
+            # The stock check and the upsert are a single statement
+            if CartItem.objects.add(cart, product_id, quantity) is None:
+                return APIResponse.error(
+                    "Invalid request",
+                    details={
+                        "product_id": ["Product not found or out of stock"]
+                    },
+                )
 
-            cart_serializer = CartSerializer(cart)
-            return APIResponse.success(cart_serializer.data)
+            return APIResponse.success(serialize_cart(cart))
 
         return APIResponse.error("Invalid request", details=serializer.errors)
 
@@ -127,5 +404,20 @@ def remove_from_cart(request, product_id):
 
     cart_item.delete()
 
-    cart_serializer = CartSerializer(cart)
-    return APIResponse.success(cart_serializer.data)
+    return APIResponse.success(serialize_cart(cart))
+
+
+def serialize_cart(cart):
+    """
+    Cart representation from a single query for its items and products.
+
+    Cart.total and Cart.items_count read the same prefetched items.
+    """
+    prefetch_related_objects(
+        [cart],
+        Prefetch(
+            "items",
+            queryset=CartItem.objects.select_related("product").order_by("id"),
+        ),
+    )
+    return CartSerializer(cart).data
@@ -0,0 +1,46 @@
+from django.db import transaction
+from django.db.models import F
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from apps.common.cache import bump_generation
+from apps.products.models import CATALOG_CACHE, Product, rating_average
+
+from .models import Review
+
+
+@receiver(post_save, sender=Review)
+def update_product_rating(sender, instance, created, **kwargs):
+    products = Product.objects.filter(pk=instance.product_id)
+    if created:
+        products.update(
+            reviews_count=F("reviews_count") + 1,
+            rating_sum=F("rating_sum") + instance.rating,
+            average_rating=rating_average(
+                F("rating_sum") + instance.rating, F("reviews_count") + 1
+            ),
+            updated_at=timezone.now(),
+        )
+    else:
+        # Ratings are only edited through the admin, recount the product
+        products.refresh_counters()
+        products.update(updated_at=timezone.now())
+
+
+@receiver(post_delete, sender=Review)
+def remove_product_rating(sender, instance, **kwargs):
+    Product.objects.filter(pk=instance.product_id, reviews_count__gt=0).update(
+        reviews_count=F("reviews_count") - 1,
+        rating_sum=F("rating_sum") - instance.rating,
+        average_rating=rating_average(
+            F("rating_sum") - instance.rating, F("reviews_count") - 1
+        ),
+        updated_at=timezone.now(),
+    )
+
+
+@receiver(post_save, sender=Review)
+@receiver(post_delete, sender=Review)
+def invalidate_catalog_cache(sender, **kwargs):
+    transaction.on_commit(lambda: bump_generation(CATALOG_CACHE))
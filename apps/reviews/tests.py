@@ -1,3 +1,65 @@
-from django.test import TestCase
+from django.test import TestCase, override_settings
 
-# Create your tests here.
+from apps.products.models import Category, Product
+from apps.users.models import User
+
+from .models import Review
+
+LOCMEM_CACHES = {
+    "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}
+}
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class ReviewCounterTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name="Phones", slug="phones")
+        cls.product = Product.objects.create(
+            title="Phone", description="Phone", price="1.00", category=category
+        )
+        cls.users = [
+            User.objects.create(phone=f"+99890000000{index}")
+            for index in range(3)
+        ]
+
+    def assertCounters(self, reviews_count, rating_sum, average_rating):
+        self.product.refresh_from_db()
+        self.assertEqual(
+            (
+                self.product.reviews_count,
+                self.product.rating_sum,
+                self.product.average_rating,
+            ),
+            (reviews_count, rating_sum, average_rating),
+        )
+
+    def test_counters_follow_reviews(self):
+        self.assertCounters(0, 0, 0)
+        first, second, _ = [
+            Review.objects.create(
+                user=user, product=self.product, rating=rating
+            )
+            for user, rating in zip(self.users, [5, 4, 2])
+        ]
+        self.assertCounters(3, 11, 11 / 3)
+
+        # Edited ratings recount the product
+        second.rating = 1
+        second.save()
+        self.assertCounters(3, 8, 8 / 3)
+
+        first.delete()
+        self.assertCounters(2, 3, 1.5)
+        Review.objects.filter(product=self.product).delete()
+        self.assertCounters(0, 0, 0)
+
+    def test_refresh_counters_repairs_drift(self):
+        Review.objects.create(
+            user=self.users[0], product=self.product, rating=4
+        )
+        Product.objects.filter(pk=self.product.pk).update(
+            reviews_count=9, rating_sum=1, average_rating=0.5
+        )
+        Product.objects.filter(pk=self.product.pk).refresh_counters()
+        self.assertCounters(1, 4, 4.0)
@@ -119,6 +119,14 @@ STATICFILES_DIRS = [BASE_DIR / "static"]
 MEDIA_URL = "/media/"
 MEDIA_ROOT = BASE_DIR / "media"
 
+# Uploads are named after their content hash, duplicates share a file
+STORAGES = {
+    "default": {"BACKEND": "apps.common.storage.ContentAddressedStorage"},
+    "staticfiles": {
+        "BACKEND": "django.contrib.staticfiles.storage.StaticFilesStorage"
+    },
+}
+
 # Default primary key field type
 DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 
@@ -134,7 +142,12 @@ REST_FRAMEWORK = {
         "rest_framework.permissions.IsAuthenticated",
     ],
     "DEFAULT_RENDERER_CLASSES": [
-        "rest_framework.renderers.JSONRenderer",
+        "apps.common.renderers.ORJSONRenderer",
+    ],
+    "DEFAULT_PARSER_CLASSES": [
+        "apps.common.parsers.ORJSONParser",
+        "rest_framework.parsers.FormParser",
+        "rest_framework.parsers.MultiPartParser",
     ],
     "DEFAULT_PAGINATION_CLASS": "rest_framework.pagination.PageNumberPagination",
     "PAGE_SIZE": 20,
@@ -188,6 +201,55 @@ CACHES = {
     }
 }
 
+# Product search configuration
+# Dotted path to a search backend class, None picks one for the database
+PRODUCT_SEARCH_BACKEND = os.environ.get("PRODUCT_SEARCH_BACKEND") or None
+# PostgreSQL text search configuration used for stemming
+PRODUCT_SEARCH_CONFIG = os.environ.get("PRODUCT_SEARCH_CONFIG", "english")
+
+# Catalog response cache for anonymous product reads
+CATALOG_CACHE_TIMEOUT = 60 * 10
+
+# Maximum number of ids accepted by the product batch endpoint
+PRODUCT_BATCH_MAX_SIZE = 50
+
+# Product facets configuration
+# Upper bounds of the price histogram buckets, the last bucket is open
+PRODUCT_FACET_PRICE_BUCKETS = [25, 50, 100, 250, 500, 1000]
+PRODUCT_FACETS_CACHE_TIMEOUT = 60 * 15
+
+# Rows fetched per round trip by the streaming catalog export
+PRODUCT_EXPORT_CHUNK_SIZE = 2000
+
+# Product image variants, generated by Celery next to the originals
+# Longest side in pixels per variant name
+PRODUCT_IMAGE_VARIANTS = {"small": 200, "medium": 600, "large": 1200}
+PRODUCT_IMAGE_FORMATS = ["webp", "jpeg"]
+PRODUCT_IMAGE_QUALITY = 80
+
+# Product typeahead, answered from an in-memory prefix index per process
+PRODUCT_SUGGEST_LIMIT = 10
+# Seconds between rebuilds of the shared index snapshot after catalog
+# changes, and between checks of processes for a newer snapshot
+PRODUCT_SUGGEST_REFRESH_INTERVAL = 60
+
+# "Frequently bought together" products stored per product
+PRODUCT_RELATED_LIMIT = 10
+
+# Trending products, scored from recent likes, orders and reviews
+PRODUCT_TRENDING_WINDOW_DAYS = 30
+PRODUCT_TRENDING_HALF_LIFE_DAYS = 3
+PRODUCT_TRENDING_WEIGHTS = {"likes": 1, "orders": 3, "reviews": 2}
+# Products returned per category by the trending endpoint
+PRODUCT_TRENDING_LIMIT = 20
+
+# Dotted path to a like store class, None writes through to the database.
+# "apps.products.likes.RedisLikeStore" buffers toggles in Redis, flushed
+# by the celery beat scheduler, which must then be running
+PRODUCT_LIKE_STORE = os.environ.get("PRODUCT_LIKE_STORE") or None
+# Liked product ids per user, cached by the database like store
+PRODUCT_LIKED_IDS_CACHE_TIMEOUT = 60 * 10
+
 # Eskiz SMS Configuration
 ESKIZ_EMAIL = os.environ.get("ESKIZ_EMAIL", "")
 ESKIZ_PASSWORD = os.environ.get("ESKIZ_PASSWORD", "")
@@ -200,6 +262,29 @@ CELERY_ACCEPT_CONTENT = ["json"]
 CELERY_TASK_SERIALIZER = "json"
 CELERY_RESULT_SERIALIZER = "json"
 CELERY_TIMEZONE = TIME_ZONE
+# Periodic jobs, run by `celery -A config beat`
+CELERY_BEAT_SCHEDULE = {
+    "compute-product-relations": {
+        "task": "apps.orders.tasks.compute_product_relations",
+        "schedule": 60 * 60 * 6,
+    },
+    "flush-product-likes": {
+        "task": "apps.products.tasks.flush_product_likes",
+        "schedule": 10,
+    },
+    "reconcile-product-likes": {
+        "task": "apps.products.tasks.reconcile_product_likes",
+        "schedule": 60 * 60,
+    },
+    "refresh-suggestion-index": {
+        "task": "apps.products.tasks.refresh_suggestion_index",
+        "schedule": PRODUCT_SUGGEST_REFRESH_INTERVAL,
+    },
+    "refresh-trending-scores": {
+        "task": "apps.products.tasks.refresh_trending_scores",
+        "schedule": 60 * 15,
+    },
+}
 
 # CORS settings
 CORS_ALLOWED_ORIGINS = [
@@ -0,0 +1,92 @@
+#!/usr/bin/env python
+"""
+Benchmark the orjson renderer against DRF's JSONRenderer on product_list
+"""
+import os
+import sys
+
+import django
+
+# Setup Django
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "config.settings.development")
+django.setup()
+
+import timeit
+from decimal import Decimal
+
+from django.db import transaction
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+
+from apps.common.renderers import ORJSONRenderer
+from apps.products.models import Category, Product
+from apps.users.models import User
+
+PAGE_SIZES = [20, 100]
+ROUNDS = 1000
+
+
+def create_products(count):
+    category = Category.objects.create(name="Benchmark", slug="benchmark")
+    Product.objects.bulk_create(
+        [
+            Product(
+                title=f"Benchmark product {index} — ünïcode",
+                description="Benchmark",
+                price=Decimal("19.99") + index,
+                category=category,
+                thumbnail=f"products/thumbnails/benchmark-{index}.jpg",
+                average_rating=index % 50 / 10,
+            )
+            for index in range(count)
+        ]
+    )
+    return category
+
+
+def product_list_payload(client, category, page_size):
+    # Authenticated requests bypass the anonymous response cache
+    response = client.get(
+        "/api/v1/shop/products/",
+        {"category": category.id, "limit": page_size},
+    )
+    return response.data
+
+
+def run_benchmark():
+    print("Benchmarking JSON renderers on product_list (renders/second)...")
+    print(f"{'size':>4} {'bytes':>7} {'json':>10} {'orjson':>10} speedup")
+
+    stock, fast = JSONRenderer(), ORJSONRenderer()
+    with transaction.atomic():
+        category = create_products(max(PAGE_SIZES))
+        client = APIClient()
+        client.force_authenticate(User.objects.create(phone="+998000000000"))
+
+        for page_size in PAGE_SIZES:
+            data = product_list_payload(client, category, page_size)
+            rendered = stock.render(data)
+            if fast.render(data) != rendered:
+                raise SystemExit(f"{page_size}: orjson output differs")
+
+            def measure(renderer):
+                seconds = min(
+                    timeit.repeat(
+                        lambda: renderer.render(data), number=ROUNDS, repeat=3
+                    )
+                )
+                return ROUNDS / seconds
+
+            json_rate, orjson_rate = measure(stock), measure(fast)
+            print(
+                f"{page_size:>4} {len(rendered):>7} {json_rate:>10.0f} "
+                f"{orjson_rate:>10.0f} {orjson_rate / json_rate:>7.1f}x"
+            )
+
+        # Leave the database as it was
+        transaction.set_rollback(True)
+
+
+if __name__ == "__main__":
+    run_benchmark()
@@ -0,0 +1,121 @@
+#!/usr/bin/env python
+"""
+Benchmark the values() fast path against the DRF list serializers
+"""
+import os
+import sys
+
+import django
+
+# Setup Django
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "config.settings.development")
+django.setup()
+
+import timeit
+from decimal import Decimal
+
+from django.db import transaction
+from rest_framework.renderers import JSONRenderer
+
+from apps.orders.models import Order, OrderItem
+from apps.orders.serializers import OrderListSerializer, order_list_values
+from apps.products.models import Category, Product
+from apps.products.serializers import (
+    ProductListSerializer,
+    product_list_values,
+)
+from apps.users.models import User
+
+PAGE_SIZES = [20, 100]
+ROUNDS = 200
+
+
+def create_rows(count):
+    category = Category.objects.create(name="Benchmark", slug="benchmark")
+    products = Product.objects.bulk_create(
+        [
+            Product(
+                title=f"Benchmark product {index}",
+                description="Benchmark",
+                price=Decimal("19.99") + index,
+                category=category,
+                thumbnail=f"products/thumbnails/benchmark-{index}.jpg",
+            )
+            for index in range(count)
+        ]
+    )
+    user = User.objects.create(phone="+998000000000")
+    # Order.save sends notifications, bulk_create skips it
+    orders = Order.objects.bulk_create(
+        [
+            Order(
+                user=user,
+                order_number=f"BENCH-{index}",
+                shipping_address="Benchmark",
+                subtotal=Decimal("10.00"),
+                total=Decimal("15.00"),
+            )
+            for index in range(count)
+        ]
+    )
+    OrderItem.objects.bulk_create(
+        [
+            OrderItem(order=order, product=product, quantity=2, price=1)
+            for order in orders
+            for product in products[:3]
+        ]
+    )
+    return category, user
+
+
+def measure(name, page_size, drf_page, fast_page):
+    renderer = JSONRenderer()
+    if renderer.render(drf_page()) != renderer.render(fast_page()):
+        raise SystemExit(f"{name}: fast path output differs")
+
+    drf = min(timeit.repeat(drf_page, number=ROUNDS, repeat=3)) / ROUNDS
+    fast = min(timeit.repeat(fast_page, number=ROUNDS, repeat=3)) / ROUNDS
+    print(
+        f"{name:<8} {page_size:>4} "
+        f"{1 / drf:>10.0f} {1 / fast:>10.0f} {drf / fast:>7.1f}x"
+    )
+
+
+def run_benchmark():
+    print("Benchmarking list serializers (pages per second)...")
+    print(f"{'endpoint':<8} {'size':>4} {'drf':>10} {'values':>10} speedup")
+
+    with transaction.atomic():
+        category, user = create_rows(max(PAGE_SIZES))
+        products = Product.objects.filter(category=category).order_by("id")
+        orders = Order.objects.filter(user=user).order_by("-created_at", "-id")
+
+        for page_size in PAGE_SIZES:
+            measure(
+                "products",
+                page_size,
+                lambda: ProductListSerializer(
+                    products.select_related("category")[:page_size], many=True
+                ).data,
+                lambda: product_list_values.serialize(
+                    product_list_values.values(products)[:page_size]
+                ),
+            )
+            measure(
+                "orders",
+                page_size,
+                lambda: OrderListSerializer(
+                    orders[:page_size], many=True
+                ).data,
+                lambda: order_list_values.serialize(
+                    order_list_values.values(orders)[:page_size]
+                ),
+            )
+
+        # Leave the database as it was
+        transaction.set_rollback(True)
+
+
+if __name__ == "__main__":
+    run_benchmark()